@@ -5,18 +5,21 @@ MONAI 저장소에서 환경 설정 커밋을 정확히 찾기
 
 import os
 import subprocess
+import sys
 import re
 from pathlib import Path
 from datetime import datetime
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "make_datasets"))
+from repo_cache import RepoCache
+
 def clone_monai_repo():
     """MONAI 저장소를 클론합니다."""
     repo_path = "MONAI"
     if not os.path.exists(repo_path):
         print("📥 MONAI 저장소 클론 중...")
-        subprocess.run([
-            "git", "clone", "https://github.com/Project-MONAI/MONAI.git", repo_path
-        ], check=True)
+        # 로컬 mirror 캐시에서 클론 (네트워크 클론은 머신당 한 번)
+        RepoCache().clone("Project-MONAI/MONAI", repo_path, fetch=True)
         print("✅ MONAI 저장소 클론 완료")
     else:
         print("✅ MONAI 저장소 이미 존재")
@@ -4,9 +4,12 @@ MONAI 저장소에서 기본 테스트 패치를 생성
 """
 
 import os
-import subprocess
+import sys
 from pathlib import Path
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "make_datasets"))
+from repo_cache import RepoCache
+
 def generate_basic_test_patch():
     """기본 테스트 패치를 생성합니다."""
     
@@ -14,9 +17,8 @@ def generate_basic_test_patch():
     repo_path = "MONAI"
     if not os.path.exists(repo_path):
         print("📥 MONAI 저장소 클론 중...")
-        subprocess.run([
-            "git", "clone", "https://github.com/Project-MONAI/MONAI.git", repo_path
-        ], check=True)
+        # 로컬 mirror 캐시에서 클론 (네트워크 클론은 머신당 한 번)
+        RepoCache().clone("Project-MONAI/MONAI", repo_path, fetch=True)
     
     # 기본 테스트 패치 생성
     test_patch = '''diff --git a/test_monai_basic.py b/test_monai_basic.py
@@ -5,9 +5,13 @@ MONAI 저장소에서 환경 설정 커밋을 찾기
 
 import os
 import subprocess
+import sys
 import re
 from pathlib import Path
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "make_datasets"))
+from repo_cache import RepoCache
+
 def get_environment_setup_commit():
     """환경 설정 커밋을 찾습니다."""
     
@@ -15,9 +19,8 @@ def get_environment_setup_commit():
     repo_path = "MONAI"
     if not os.path.exists(repo_path):
         print("📥 MONAI 저장소 클론 중...")
-        subprocess.run([
-            "git", "clone", "https://github.com/Project-MONAI/MONAI.git", repo_path
-        ], check=True)
+        # 로컬 mirror 캐시에서 클론 (네트워크 클론은 머신당 한 번)
+        RepoCache().clone("Project-MONAI/MONAI", repo_path, fetch=True)
     
     # 저장소 디렉토리로 이동
     os.chdir(repo_path)
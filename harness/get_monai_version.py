@@ -4,10 +4,13 @@ MONAI 저장소에서 버전 정보를 추출
 """
 
 import os
-import subprocess
+import sys
 import re
 from pathlib import Path
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "make_datasets"))
+from repo_cache import RepoCache
+
 def get_monai_version():
     """MONAI 버전을 추출합니다."""
     
@@ -15,9 +18,8 @@ def get_monai_version():
     repo_path = "MONAI"
     if not os.path.exists(repo_path):
         print("📥 MONAI 저장소 클론 중...")
-        subprocess.run([
-            "git", "clone", "https://github.com/Project-MONAI/MONAI.git", repo_path
-        ], check=True)
+        # 로컬 mirror 캐시에서 클론 (네트워크 클론은 머신당 한 번)
+        RepoCache().clone("Project-MONAI/MONAI", repo_path, fetch=True)
     
     # setup.py에서 버전 추출
     setup_py_path = os.path.join(repo_path, "setup.py")
@@ -5,176 +5,1399 @@
 BM25 기반으로 PR 설명과 코드 스냅샷을 매칭해 가장 관련 높은 파일 Top‑K를 찾습니다.
 """
 
+import hashlib
 import json
 import os
 import sys
+import time
 import re
+import heapq
+from bisect import bisect_left
 from collections import defaultdict
 import math
+import mmap
+from argparse import ArgumentParser
+from array import array
+from collections.abc import Mapping
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from functools import lru_cache, partial
+
+from disk_cache import DiskLRUCache
+
+TOKEN_PATTERN = re.compile(r'\b\w+\b')
+INDEX_MAGIC = b"BM25IDX1"
+# MaxScore는 양의 idf 쿼리 단어가 이보다 많으면 exhaustive보다 느려짐 (bm25_benchmark, Zipf 코퍼스 기준)
+MAXSCORE_MAX_TERMS = 128
+
+
+def tokenize(text):
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+def tokenizer_signature(tokenizer):
+    """
+    Name stored in saved indexes so they are only reopened with the tokenizer
+    that built them.
+    """
+    return getattr(tokenizer, 'signature', None) or getattr(tokenizer, '__name__', type(tokenizer).__name__)
+
+
+def git_blob_sha(content):
+    """
+    SHA-1 that git assigns to a blob with this (utf-8) content.
+    """
+    data = content.encode('utf-8', errors='surrogateescape')
+    return hashlib.sha1(b"blob %d\0" % len(data) + data).hexdigest()
+
+
+def _align(offset, size=8):
+    return (offset + size - 1) // size * size
+
+
+def _mmap_file(f):
+    return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+class TermArrayView(Mapping):
+    """
+    Read-only term -> value mapping over the flat arrays of a saved index.
+    Values are built on access, so nothing but the vocabulary is materialized.
+    """
+
+    def __init__(self, term_ids, value_fn):
+        self.term_ids = term_ids
+        self.value_fn = value_fn
+
+    def __getitem__(self, term):
+        return self.value_fn(self.term_ids[term])
+
+    def __contains__(self, term):
+        return term in self.term_ids
+
+    def __iter__(self):
+        return iter(self.term_ids)
+
+    def __len__(self):
+        return len(self.term_ids)
+
 
 # BM25 구현
 class BM25Retriever:
-    def __init__(self, k1=1.5, b=0.75):
+    """
+    Inverted-index BM25. Each term keeps a posting list of (doc index, tf) and
+    its per-document BM25 weights are computed once, the first time the term is
+    queried. Scores only accumulate over documents that contain a query term.
+    """
+
+    def __init__(self, k1=1.5, b=0.75, tokenizer=None):
         self.k1 = k1
         self.b = b
+        # text -> list of terms. A tokenizer may also define tokenize_query()
+        # for queries, which are prose rather than code.
+        self.tokenizer = tokenizer or tokenize
         self.documents = []
-        self.doc_freq = defaultdict(int)  # term -> number of docs containing term
-        self.term_freq = []  # list of dicts, each dict is doc_id -> term_freq
+        # term -> total number of occurrences in the corpus. This is what the
+        # original scorer used as "df", so it is kept as-is to reproduce the
+        # rankings in existing bm25_text_results.jsonl files.
+        self.doc_freq = defaultdict(int)
+        self.postings = {}  # term -> (list of doc indices, list of term frequencies)
         self.doc_lengths = []
         self.avg_doc_length = 0
         self.N = 0  # total number of documents
-        
+        self.reset_caches()
+
     def fit(self, documents):
         """
-        documents: list of dicts with 'docid' and 'content' keys
+        documents: iterable of dicts with 'docid' and 'content' keys, e.g. a
+        list or iter_documents(). Contents are dropped once tokenized; only
+        the docids are kept.
         """
-        self.documents = documents
-        self.N = len(documents)
-        
-        # Calculate document frequencies and lengths
-        for doc in documents:
-            doc_id = doc['docid']
-            content = doc['content']
-            
-            # Tokenize content (simple word splitting)
-            terms = re.findall(r'\b\w+\b', content.lower())
-            
-            # Calculate term frequencies for this document
+        self.documents = []
+        self.doc_freq = defaultdict(int)
+        self.postings = {}
+        self.doc_lengths = []
+
+        for doc_idx, doc in enumerate(documents):
+            self.documents.append({'docid': doc['docid']})
+            terms = self.tokenizer(doc['content'])
+
             term_freq = defaultdict(int)
             for term in terms:
                 term_freq[term] += 1
-                self.doc_freq[term] += 1
-            
-            self.term_freq.append(term_freq)
+
+            for term, tf in term_freq.items():
+                self.doc_freq[term] += tf
+                posting = self.postings.get(term)
+                if posting is None:
+                    posting = self.postings[term] = ([], [])
+                posting[0].append(doc_idx)
+                posting[1].append(tf)
+
             self.doc_lengths.append(len(terms))
-        
+
+        self.N = len(self.documents)
         # Calculate average document length
         self.avg_doc_length = sum(self.doc_lengths) / self.N if self.N > 0 else 0
-    
-    def search(self, query, top_k=20):
+        self.reset_caches()
+
+    def tokenize_query(self, query):
+        return getattr(self.tokenizer, 'tokenize_query', self.tokenizer)(query)
+
+    def reset_caches(self):
+        """
+        Drops the weights cached for the current corpus and k1/b.
+        """
+        self._weights = {}  # term -> (doc indices, BM25 weights aligned with them)
+        self._upper_bounds = {}  # term -> largest BM25 weight of the term
+        self._norms = None  # per-document length normalisation, k1 * (1 - b + b * dl / avgdl)
+
+    def idf(self, term):
+        df = self.doc_freq.get(term, 0)
+        if df > 0 and df < self.N:
+            return math.log((self.N - df + 0.5) / (df + 0.5))
+        return 0  # Skip terms that appear in all or no documents
+
+    def _length_norm(self, doc_idx):
+        return self.k1 * (1 - self.b + self.b * (self.doc_lengths[doc_idx] / self.avg_doc_length))
+
+    def _length_norms(self):
+        if self._norms is None:
+            self._norms = [self._length_norm(doc_idx) for doc_idx in range(self.N)]
+        return self._norms
+
+    def term_weights(self, term):
+        """
+        Returns (doc indices, BM25 weights) for every document containing term.
+        """
+        cached = self._weights.get(term)
+        if cached is None:
+            doc_ids, tfs = self.postings[term]
+            idf = self.idf(term)
+            norms = self._length_norms()
+            k1_plus_1 = self.k1 + 1
+            weights = [
+                idf * (tf * k1_plus_1 / denominator) if (denominator := tf + norms[doc_idx]) > 0 else 0
+                for doc_idx, tf in zip(doc_ids, tfs)
+            ]
+            cached = self._weights[term] = (doc_ids, weights)
+        return cached
+
+    def term_upper_bound(self, term):
+        """
+        Largest BM25 weight of term over the documents containing it.
+        """
+        upper_bound = self._upper_bounds.get(term)
+        if upper_bound is None:
+            upper_bound = self._upper_bounds[term] = max(self.term_weights(term)[1], default=0)
+        return upper_bound
+
+    def _empty_score(self, doc_idx, matched):
+        # A document without any query term scores 0.0 once some query term is
+        # in the vocabulary (0 * weight), and the integer 0 otherwise.
+        if matched and self._length_norm(doc_idx) > 0:
+            return 0.0
+        return 0
+
+    def score(self, query_terms):
+        """
+        Accumulates BM25 scores over the posting lists of query_terms.
+        Returns ({doc index: score} for matching documents, whether any
+        query term is in the vocabulary).
+        """
+        scores = {}
+        matched = False
+        for term in query_terms:
+            if term not in self.postings:
+                continue
+            matched = True
+            doc_ids, weights = self.term_weights(term)
+            for doc_idx, weight in zip(doc_ids, weights):
+                scores[doc_idx] = scores.get(doc_idx, 0) + weight
+        return scores, matched
+
+    def _top_k(self, scores, matched, top_k):
+        ranked = heapq.nsmallest(top_k, scores.items(), key=lambda x: (-x[1], x[0]))
+        # Documents outside the posting lists all share the empty score, so the
+        # heap over matching documents is exact whenever its last entry beats it.
+        if len(ranked) < top_k or (ranked and ranked[-1][1] <= 0):
+            if len(scores) < self.N:
+                ranked = heapq.nsmallest(
+                    top_k,
+                    (
+                        (doc_idx, scores[doc_idx] if doc_idx in scores else self._empty_score(doc_idx, matched))
+                        for doc_idx in range(self.N)
+                    ),
+                    key=lambda x: (-x[1], x[0]),
+                )
+        return ranked
+
+    def _maxscore_top_k(self, query_terms, top_k):
+        """
+        MaxScore top-k. Terms with a positive idf are visited from the largest
+        upper bound (their highest weight) down, accumulating partial scores,
+        until the bounds of the unvisited terms can no longer reach a lower
+        bound of the k-th score. Candidates are then checked in order of their
+        upper bound against the unvisited terms one lookup at a time, and only
+        the survivors are scored exactly. Weights of terms with a negative idf
+        (the long, common ones) are only computed for those survivors.
+
+        Returns None when documents outside the posting lists could still enter
+        the top-k (the k-th score is not positive), or when the query has more
+        than MAXSCORE_MAX_TERMS positive-idf terms, where the bookkeeping costs
+        more than it prunes; exhaustive scoring is used instead.
+        """
+        if top_k <= 0:
+            return []
+        if not (self.k1 >= 0 and 0 <= self.b <= 1):
+            return None  # the weight bounds below assume a non-negative length norm
+        counts = defaultdict(int)
+        idfs = {}
+        for term in query_terms:
+            if term in self.postings:
+                counts[term] += 1
+                idfs[term] = self.idf(term)
+        if not counts:
+            return None
+        # Terms with a zero idf only add 0.0, which cannot change a positive score
+        matched_terms = [term for term in query_terms if idfs.get(term, 0) != 0]
+        norms = self._length_norms()
+        k1_plus_1 = self.k1 + 1
+
+        # Bounds are widened by a relative slack that covers rounding differences
+        # between the partial sums below and scores summed in query order.
+        slack = 1e-9
+        upper_bounds = {}
+        negative_bound = 0  # lowest total contribution of negative-idf terms
+        for term, count in counts.items():
+            if idfs[term] > 0:
+                upper_bounds[term] = count * self.term_upper_bound(term) * (1 + slack)
+            elif idfs[term] < 0:
+                # tf / (tf + norm) < 1, so a weight is never below idf * (k1 + 1)
+                negative_bound += count * idfs[term] * k1_plus_1 * (1 + slack)
+        if len(upper_bounds) > MAXSCORE_MAX_TERMS:
+            return None
+        terms = sorted(upper_bounds, key=lambda term: -upper_bounds[term])
+        remaining_bound = sum(upper_bounds.values())
+
+        def lookup(term, doc_idx):
+            doc_ids, weights = self.term_weights(term)
+            pos = bisect_left(doc_ids, doc_idx)
+            if pos < len(doc_ids) and doc_ids[pos] == doc_idx:
+                return weights[pos]
+            return None
+
+        scored_postings = {term: self.postings[term] for term in counts if idfs[term] != 0}
+
+        def exact_score(doc_idx):
+            term_scores = {}
+            for term, (doc_ids, tfs) in scored_postings.items():
+                pos = bisect_left(doc_ids, doc_idx)
+                if pos < len(doc_ids) and doc_ids[pos] == doc_idx:
+                    # Same expression as term_weights()
+                    tf = tfs[pos]
+                    denominator = tf + norms[doc_idx]
+                    term_scores[term] = idfs[term] * (tf * k1_plus_1 / denominator) if denominator > 0 else 0
+            # Same additions in the same (query) order as score()
+            score = 0
+            for term in matched_terms:
+                if term in term_scores:
+                    score += term_scores[term]
+            return score
+
+        # A document scores at least its partial score (weights of the visited
+        # terms) plus negative_bound, so the k-th largest partial score plus
+        # negative_bound never exceeds the final k-th score.
+        partial = defaultdict(float)
+        threshold = None
+        visited = 0
+        for term in terms:
+            # Unvisited documents only contain this and lower-bound terms. A
+            # document tying the k-th score can still win on its index, so
+            # only a strictly lower bound is pruned.
+            if threshold is not None and remaining_bound < threshold:
+                break
+            remaining_bound -= upper_bounds[term]
+            visited += 1
+            count = counts[term]
+            for doc_idx, weight in zip(*self.term_weights(term)):
+                partial[doc_idx] += count * weight
+            if len(partial) >= top_k and remaining_bound < max(partial.values()) + negative_bound:
+                kth_partial = heapq.nlargest(top_k, partial.values())[-1]
+                threshold = kth_partial * (1 - slack) + negative_bound
+
+        unvisited = terms[visited:]
+        candidates = sorted(
+            ((partial_score + remaining_bound, doc_idx) for doc_idx, partial_score in partial.items()),
+            reverse=True,
+        )
+        heap = []  # (score, -doc index), worst entry first
+        for bound, doc_idx in candidates:
+            if len(heap) == top_k and (threshold is None or heap[0][0] > threshold):
+                threshold = heap[0][0]
+            if threshold is not None and bound * (1 + slack) < threshold:
+                break
+            if threshold is not None:
+                for term in unvisited:
+                    weight = lookup(term, doc_idx)
+                    bound -= upper_bounds[term]
+                    if weight is not None:
+                        bound += counts[term] * weight
+                    if bound * (1 + slack) < threshold:
+                        break
+                if bound * (1 + slack) < threshold:
+                    continue
+            entry = (exact_score(doc_idx), -doc_idx)
+            if len(heap) < top_k:
+                heapq.heappush(heap, entry)
+            elif entry > heap[0]:
+                heapq.heapreplace(heap, entry)
+
+        ranked = [(-neg_doc_idx, score) for score, neg_doc_idx in sorted(heap, reverse=True)]
+        if len(ranked) < top_k or ranked[-1][1] <= 0:
+            return None
+        return ranked
+
+    def search(self, query, top_k=20, prune=False):
         """
         query: string to search for
         top_k: number of top results to return
+        prune: use MaxScore dynamic pruning (same results as exhaustive scoring)
         """
-        # Tokenize query
-        query_terms = re.findall(r'\b\w+\b', query.lower())
-        
-        scores = []
-        for i, doc in enumerate(self.documents):
-            score = 0
-            doc_length = self.doc_lengths[i]
-            
-            for term in query_terms:
-                if term in self.doc_freq:
-                    # Calculate IDF with safety check
-                    df = self.doc_freq[term]
-                    if df > 0 and df < self.N:
-                        idf = math.log((self.N - df + 0.5) / (df + 0.5))
-                    else:
-                        idf = 0  # Skip terms that appear in all or no documents
-                    
-                    # Calculate TF
-                    tf = self.term_freq[i].get(term, 0)
-                    
-                    # Calculate BM25 score
-                    numerator = tf * (self.k1 + 1)
-                    denominator = tf + self.k1 * (1 - self.b + self.b * (doc_length / self.avg_doc_length))
-                    
-                    if denominator > 0:
-                        score += idf * (numerator / denominator)
-            
-            scores.append((i, score))
-        
-        # Sort by score (descending) and return top_k results
-        scores.sort(key=lambda x: x[1], reverse=True)
-        
-        results = []
-        for doc_idx, score in scores[:top_k]:
-            results.append({
+        query_terms = self.tokenize_query(query)
+        ranked = self._maxscore_top_k(query_terms, top_k) if prune else None
+        if ranked is None:
+            scores, matched = self.score(query_terms)
+            ranked = self._top_k(scores, matched, top_k)
+        return [
+            {
                 'docid': self.documents[doc_idx]['docid'],
                 'score': score
-            })
-        
-        return results
+            }
+            for doc_idx, score in ranked
+        ]
 
-def main():
-    # Load filtered PRs
-    with open('filtered_prs.json', 'r') as f:
-        filtered_prs = json.load(f)
-    
-    # Process each PR
-    results = []
+    def search_batch(self, queries, top_k=20, prune=False):
+        """
+        queries: list of query strings scored against the same corpus
+        """
+        return [self.search(query, top_k=top_k, prune=prune) for query in queries]
+
+    def save(self, path):
+        """
+        Writes the index to a single binary file: a JSON header (parameters,
+        docids, section sizes) followed by the vocabulary and flat int arrays
+        for doc lengths, term counts, posting offsets, posting doc indices and
+        posting term frequencies. Term frequencies are stored instead of
+        weights so scores stay exact and k1/b can be changed on load.
+        """
+        terms = list(self.postings)
+        doc_freqs = array('q')
+        offsets = array('q', [0])
+        posting_docs = array('i')
+        posting_tfs = array('i')
+        for term in terms:
+            doc_ids, tfs = self.postings[term]
+            doc_freqs.append(self.doc_freq[term])
+            posting_docs.extend(doc_ids)
+            posting_tfs.extend(tfs)
+            offsets.append(len(posting_docs))
+
+        sections = [
+            "\n".join(terms).encode('utf-8'),
+            array('i', self.doc_lengths).tobytes(),
+            doc_freqs.tobytes(),
+            offsets.tobytes(),
+            posting_docs.tobytes(),
+            posting_tfs.tobytes(),
+        ]
+        header = json.dumps({
+            'k1': self.k1,
+            'b': self.b,
+            'N': self.N,
+            'avg_doc_length': self.avg_doc_length,
+            'byteorder': sys.byteorder,
+            'tokenizer': tokenizer_signature(self.tokenizer),
+            'num_terms': len(terms),
+            'docids': [doc['docid'] for doc in self.documents],
+            'sections': [len(section) for section in sections],
+        }).encode('utf-8')
+
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(INDEX_MAGIC)
+            f.write(len(header).to_bytes(8, 'little'))
+            f.write(header)
+            for section in sections:
+                f.write(b'\0' * (_align(f.tell()) - f.tell()))
+                f.write(section)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path, mmap=True, k1=None, b=None, tokenizer=None):
+        """
+        Opens an index written by save(). With mmap=True the posting arrays
+        are read straight from the page cache instead of being copied into
+        memory. k1/b default to the values the index was built with, and
+        tokenizer must be the one it was built with (None for tokenize()).
+        """
+        with open(path, 'rb') as f:
+            if f.read(len(INDEX_MAGIC)) != INDEX_MAGIC:
+                raise ValueError(f"Not a BM25 index: {path}")
+            header_length = int.from_bytes(f.read(8), 'little')
+            header = json.loads(f.read(header_length))
+            if header['byteorder'] != sys.byteorder:
+                raise ValueError(f"Index {path} was written with {header['byteorder']} byte order")
+            built_with = header.get('tokenizer', tokenizer_signature(tokenize))
+            if built_with != tokenizer_signature(tokenizer or tokenize):
+                raise ValueError(
+                    f"Index {path} was built with the {built_with} tokenizer, "
+                    f"not {tokenizer_signature(tokenizer or tokenize)}"
+                )
+            if mmap:
+                buffer = memoryview(_mmap_file(f))
+            else:
+                f.seek(0)
+                buffer = memoryview(f.read())
+
+        sections = []
+        offset = len(INDEX_MAGIC) + 8 + header_length
+        for length in header['sections']:
+            offset = _align(offset)
+            sections.append(buffer[offset : offset + length])
+            offset += length
+        vocab, doc_lengths, doc_freqs, offsets, posting_docs, posting_tfs = sections
+        doc_lengths = doc_lengths.cast('i')
+        doc_freqs = doc_freqs.cast('q')
+        offsets = offsets.cast('q')
+        posting_docs = posting_docs.cast('i')
+        posting_tfs = posting_tfs.cast('i')
+
+        terms = str(vocab, 'utf-8').split("\n") if header['num_terms'] else []
+        term_ids = {term: term_id for term_id, term in enumerate(terms)}
+
+        retriever = cls(
+            k1=header['k1'] if k1 is None else k1,
+            b=header['b'] if b is None else b,
+            tokenizer=tokenizer,
+        )
+        retriever.documents = [{'docid': docid} for docid in header['docids']]
+        retriever.N = header['N']
+        retriever.avg_doc_length = header['avg_doc_length']
+        retriever.doc_lengths = doc_lengths
+        retriever.doc_freq = TermArrayView(term_ids, doc_freqs.__getitem__)
+        retriever.postings = TermArrayView(
+            term_ids,
+            lambda term_id: (
+                posting_docs[offsets[term_id] : offsets[term_id + 1]],
+                posting_tfs[offsets[term_id] : offsets[term_id + 1]],
+            ),
+        )
+        return retriever
+
+class IncrementalBM25Retriever(BM25Retriever):
+    """
+    BM25 over a corpus that changes a few files at a time, such as the base
+    commits of consecutive PRs. Files are keyed by git blob SHA: each blob is
+    tokenized once, and update() moves the index to a new snapshot by removing
+    and adding only the files whose blob changed, keeping N, the total length
+    and the term counts up to date. Rankings match a fresh fit on the snapshot.
+    """
+
+    def __init__(self, k1=1.5, b=0.75, tokenizer=None):
+        super().__init__(k1=k1, b=b, tokenizer=tokenizer)
+        self.doc_blobs = {}  # docid -> blob sha of the current snapshot
+        self.blob_terms = {}  # blob sha -> (doc length, {term: tf})
+        self.blob_refs = defaultdict(int)  # blob sha -> number of docids using it
+        self.term_postings = {}  # term -> {docid: tf}
+        self.total_length = 0
+        self.positions = {}  # docid -> index in the current snapshot
+        self.postings = TermArrayView(self.term_postings, self._ordered_posting)
+
+    def _ordered_posting(self, docid_tfs):
+        # Postings are kept sorted by document index like the ones built by fit()
+        posting = sorted((self.positions[docid], tf) for docid, tf in docid_tfs.items())
+        return [doc_idx for doc_idx, _ in posting], [tf for _, tf in posting]
+
+    def fit(self, documents):
+        """
+        documents: iterable of dicts with 'docid' and 'content' keys
+        """
+        self.doc_blobs = {}
+        self.blob_terms = {}
+        self.blob_refs = defaultdict(int)
+        self.term_postings.clear()
+        self.doc_freq = defaultdict(int)
+        self.total_length = 0
+        self.update(documents)
+
+    def _add(self, docid, sha, content):
+        if sha not in self.blob_terms:
+            term_freq = defaultdict(int)
+            terms = self.tokenizer(content)
+            for term in terms:
+                term_freq[term] += 1
+            self.blob_terms[sha] = (len(terms), dict(term_freq))
+        self.blob_refs[sha] += 1
+        length, term_freq = self.blob_terms[sha]
+        for term, tf in term_freq.items():
+            posting = self.term_postings.get(term)
+            if posting is None:
+                posting = self.term_postings[term] = {}
+            posting[docid] = tf
+            self.doc_freq[term] += tf
+        self.total_length += length
+
+    def _remove(self, docid, sha):
+        length, term_freq = self.blob_terms[sha]
+        for term, tf in term_freq.items():
+            posting = self.term_postings[term]
+            del posting[docid]
+            if not posting:
+                del self.term_postings[term]
+            self.doc_freq[term] -= tf
+            if self.doc_freq[term] == 0:
+                del self.doc_freq[term]
+        self.total_length -= length
+        self.blob_refs[sha] -= 1
+
+    def update(self, documents):
+        """
+        Moves the index to the snapshot given by documents (iterable of dicts
+        with 'docid' and 'content' keys). Each file is applied as it streams
+        in, so contents are never held past their own update. Returns
+        (added, removed) file counts.
+        """
+        new_blobs = {}
+        added = removed = 0
+        for doc in documents:
+            docid = doc['docid']
+            sha = new_blobs[docid] = git_blob_sha(doc['content'])
+            old_sha = self.doc_blobs.get(docid)
+            if old_sha == sha:
+                continue
+            if old_sha is not None:
+                self._remove(docid, old_sha)
+                removed += 1
+            self._add(docid, sha, doc['content'])
+            added += 1
+        # 새 스냅샷에 없는 파일 제거
+        for docid, sha in self.doc_blobs.items():
+            if docid not in new_blobs:
+                self._remove(docid, sha)
+                removed += 1
+        # blob은 추가가 끝난 뒤에 정리해야 경로만 바뀐 파일을 다시 토큰화하지 않음
+        for sha in [sha for sha, refs in self.blob_refs.items() if refs == 0]:
+            del self.blob_refs[sha]
+            del self.blob_terms[sha]
+
+        self.doc_blobs = new_blobs
+        self.documents = [{'docid': docid} for docid in new_blobs]
+        self.positions = {docid: doc_idx for doc_idx, docid in enumerate(new_blobs)}
+        self.doc_lengths = [self.blob_terms[sha][0] for sha in new_blobs.values()]
+        self.N = len(new_blobs)
+        self.avg_doc_length = self.total_length / self.N if self.N > 0 else 0
+        self.reset_caches()
+        return added, removed
+
+
+RETRIEVERS = {
+    "python": BM25Retriever,
+}
+
+
+def get_retriever_class(backend):
+    if backend == "sparse":
+        # numpy/scipy는 sparse 백엔드에서만 필요
+        from bm25_sparse import SparseBM25Retriever
+
+        return SparseBM25Retriever
+    return RETRIEVERS[backend]
+
+
+def get_tokenizer(tokenizer="default", strip_comments=False, strip_strings=False, token_cache_dir=None):
+    """
+    Returns the document tokenizer for a --tokenizer choice. None means the
+    built-in tokenize(), which the existing results were produced with.
+    """
+    if tokenizer == "default":
+        return None
+    from bm25_tokenizer import CodeTokenizer
+
+    return CodeTokenizer(
+        strip_comments=strip_comments, strip_strings=strip_strings, cache_dir=token_cache_dir
+    )
+
+
+def iter_snapshot(code_snapshot_file, chunk_size=1 << 20):
+    """
+    Streams (path, content) pairs out of a code snapshot (one JSON object of
+    path -> content) without loading the whole file. Only the current entry
+    and a read-ahead chunk are held in memory.
+    """
+    decoder = json.JSONDecoder()
+    with open(code_snapshot_file, 'r', encoding='utf-8') as f:
+        buffer = ""
+        pos = 0
+        eof = False
+
+        def skip(chars):
+            nonlocal pos
+            while pos < len(buffer) and buffer[pos] in chars:
+                pos += 1
+
+        def read_more():
+            nonlocal buffer, pos, eof
+            # 긴 문자열 하나를 여러 번 다시 파싱하지 않도록 버퍼 크기만큼 더 읽음
+            chunk = f.read(max(chunk_size, len(buffer) - pos))
+            eof = not chunk
+            buffer = buffer[pos:] + chunk
+            pos = 0
+
+        def next_value():
+            # The value must be followed by at least one more character, so a
+            # token cut off at the end of the buffer is never accepted.
+            nonlocal pos
+            while True:
+                skip(" \t\r\n")
+                try:
+                    value, end = decoder.raw_decode(buffer, pos)
+                    if end < len(buffer) or eof:
+                        pos = end
+                        return value
+                except json.JSONDecodeError:
+                    if eof:
+                        raise
+                read_more()
+
+        def next_char():
+            while True:
+                skip(" \t\r\n")
+                if pos < len(buffer) or eof:
+                    return buffer[pos : pos + 1]
+                read_more()
+
+        read_more()
+        if next_char() != "{":
+            raise ValueError(f"{code_snapshot_file} is not a JSON object")
+        pos += 1
+        if next_char() == "}":
+            return
+        while True:
+            path = next_value()
+            if next_char() != ":":
+                raise ValueError(f"Expected ':' after {path!r} in {code_snapshot_file}")
+            pos += 1
+            content = next_value()
+            yield path, content
+            separator = next_char()
+            pos += 1
+            if separator == "}":
+                return
+            if separator != ",":
+                raise ValueError(f"Expected ',' or '}}' after {path!r} in {code_snapshot_file}")
+
+
+def iter_documents(code_snapshot_file):
+    # Convert code_corpus to documents for BM25, one file at a time
+    for file_path, content in iter_snapshot(code_snapshot_file):
+        yield {
+            'docid': file_path,
+            'content': content
+        }
+
+
+def iter_chunk_documents(code_snapshot_file):
+    """
+    Like iter_documents(), but yields one document per function, class or
+    module-header chunk of each file (utils.get_code_chunks), with docid
+    "path:start-end" (1-based, inclusive line span).
+    """
+    # utils는 chardet / GitPython을 import하므로 --chunking ast에서만 불러옴
+    from utils import get_code_chunks
+
+    for file_path, content in iter_snapshot(code_snapshot_file):
+        lines = content.split("\n")
+        for chunk in get_code_chunks(content, file_path):
+            yield {
+                'docid': f"{file_path}:{chunk['start']}-{chunk['end']}",
+                'content': "\n".join(lines[chunk['start'] - 1 : chunk['end']]),
+            }
+
+
+def split_chunk_docid(docid):
+    file_path, span = docid.rsplit(":", 1)
+    start, end = span.split("-")
+    return file_path, int(start), int(end)
+
+
+def aggregate_chunk_hits(chunk_hits, top_k=20):
+    """
+    Collapses ranked chunk hits into file hits scored by their best chunk.
+    Each file hit also lists the [start, end] spans of its retrieved chunks,
+    best first, so the prompt can show just those lines.
+    """
+    file_hits = {}
+    for hit in chunk_hits:
+        file_path, start, end = split_chunk_docid(hit['docid'])
+        file_hit = file_hits.get(file_path)
+        if file_hit is None:
+            file_hit = file_hits[file_path] = {'docid': file_path, 'score': hit['score'], 'spans': []}
+        file_hit['spans'].append([start, end])
+    return list(file_hits.values())[:top_k]
+
+
+DOCUMENT_SOURCES = {
+    "file": iter_documents,
+    "ast": iter_chunk_documents,
+}
+
+
+def open_retriever(
+    retriever_class,
+    code_snapshot_file,
+    index_file=None,
+    k1=1.5,
+    b=0.75,
+    tokenizer=None,
+    chunking="file",
+):
+    """
+    Loads a saved index for the snapshot if there is one, otherwise fits the
+    snapshot (and saves the index when index_file is given).
+    """
+    if index_file is not None and os.path.exists(index_file):
+        return retriever_class.load(index_file, mmap=True, k1=k1, b=b, tokenizer=tokenizer)
+    retriever = retriever_class(k1=k1, b=b, tokenizer=tokenizer)
+    retriever.fit(DOCUMENT_SOURCES[chunking](code_snapshot_file))
+    if index_file is not None and retriever.N > 0:
+        retriever.save(index_file)
+    return retriever
+
+
+def make_query(pr):
+    # Create query from PR title and body
+    title = pr.get('title', '')
+    body = pr.get('body', '')
+    return f"{title} {body}".strip()
+
+
+PENALTY_KEYWORDS = ('test', 'example', 'demo')
+
+
+@lru_cache(maxsize=1 << 16)
+def path_features(file_path, penalty_keywords=PENALTY_KEYWORDS):
+    """
+    Re-ranking features of a path, computed once per path and process:
+    every substring of its lower-cased word runs, the word runs themselves,
+    and whether it contains a penalty keyword. A query term (a run of word
+    characters) occurs in the path exactly when it is one of the substrings.
+    """
+    lowered = file_path.lower()
+    words = TOKEN_PATTERN.findall(lowered)
+    substrings = frozenset(
+        word[start:end]
+        for word in words
+        for start in range(len(word))
+        for end in range(start + 1, len(word) + 1)
+    )
+    penalized = any(keyword in lowered for keyword in penalty_keywords)
+    return substrings, frozenset(words), penalized
+
+
+class PathReranker:
+    """
+    Path-aware re-ranking of retrieved hits. A hit's score is multiplied by
+    path_boost when some query term occurs in its path, by test_penalty when
+    the path contains a penalty keyword, and by 1 + overlap_weight * (share
+    of path words that are query terms). The defaults are the original
+    heuristics, so results only change when a weight does.
+    """
+
+    def __init__(
+        self,
+        path_boost=2.0,
+        test_penalty=0.5,
+        penalty_keywords=PENALTY_KEYWORDS,
+        overlap_weight=0.0,
+        top_k=5,
+    ):
+        self.path_boost = path_boost
+        self.test_penalty = test_penalty
+        self.penalty_keywords = tuple(penalty_keywords)
+        self.overlap_weight = overlap_weight
+        self.top_k = top_k
+
+    def rerank(self, hits, query):
+        # Tokenize query for file path matching (중복 제거 후 경로 특징과 집합 연산)
+        query_terms = set(tokenize(query))
+
+        # 파일 경로에 가중치 부여 (더 관련성 높은 파일 우선)
+        for hit in hits:
+            substrings, words, penalized = path_features(hit['docid'], self.penalty_keywords)
+            # 패치가 수정하는 파일이면 우선순위 높임
+            if not query_terms.isdisjoint(substrings):
+                hit['score'] *= self.path_boost
+            # 테스트 / 예제 파일은 낮은 우선순위
+            if penalized:
+                hit['score'] *= self.test_penalty
+            if self.overlap_weight and words:
+                overlap = len(query_terms & words) / len(words)
+                if overlap:
+                    hit['score'] *= 1 + self.overlap_weight * overlap
+
+        # 상위 top_k개만 선택 (sorted(..., reverse=True)[:top_k]와 같은 순서)
+        return heapq.nlargest(self.top_k, hits, key=lambda x: x['score'])
+
+
+def group_by_base_commit(filtered_prs):
+    """
+    Groups PRs that share a base commit (and therefore a code snapshot), keeping
+    the order of first appearance.
+    """
+    groups = {}
     for pr in filtered_prs:
+        key = pr.get('base_sha') or pr['number']
+        groups.setdefault(key, []).append(pr)
+    return list(groups.values())
+
+
+# --incremental일 때 프로세스마다 하나씩 두는 공유 인덱스
+_incremental_retriever = None
+# --dense_model일 때 프로세스마다 한 번만 읽는 임베딩 모델과 저장소
+_embedding_store = None
+
+
+def get_hybrid_retriever_class(model, index_dir="dense_index", ann="exact", nprobe=8, pool_size=100, rrf_k=60):
+    """
+    Returns a HybridRetriever factory with the same (k1, b, tokenizer)
+    signature as the BM25 retriever classes.
+    """
+    global _embedding_store
+    # numpy / torch / transformers는 dense 검색에서만 필요
+    from dense_retriever import Embedder, EmbeddingStore, HybridRetriever
+
+    if _embedding_store is None:
+        _embedding_store = EmbeddingStore(index_dir, Embedder(model))
+    return partial(
+        HybridRetriever,
+        store=_embedding_store,
+        pool_size=pool_size,
+        rrf_k=rrf_k,
+        ann=ann,
+        nprobe=nprobe,
+    )
+
+
+class QueryCache:
+    """
+    Retrieved hits cached by (snapshot content, retrieval settings, query) in
+    a size-bounded SQLite LRU store. Snapshots are fingerprinted by the hash
+    of their bytes, so a changed snapshot never returns stale hits. Queries
+    are keyed by their terms, which is all BM25 scoring looks at.
+    """
+
+    def __init__(self, cache_dir, settings, max_mb=1024):
+        self.store = DiskLRUCache(os.path.join(cache_dir, "queries.sqlite"), max_bytes=max_mb << 20)
+        self.settings = json.dumps(settings, sort_keys=True)
+        self.fingerprints = {}  # snapshot path -> (size, mtime, sha1 of its bytes)
+
+    def fingerprint(self, code_snapshot_file):
+        stat = os.stat(code_snapshot_file)
+        cached = self.fingerprints.get(code_snapshot_file)
+        if cached is None or cached[:2] != (stat.st_size, stat.st_mtime_ns):
+            digest = hashlib.sha1()
+            with open(code_snapshot_file, 'rb') as f:
+                for block in iter(lambda: f.read(1 << 20), b''):
+                    digest.update(block)
+            cached = self.fingerprints[code_snapshot_file] = (
+                stat.st_size,
+                stat.st_mtime_ns,
+                digest.hexdigest(),
+            )
+        return cached[2]
+
+    def key(self, code_snapshot_file, normalized_query):
+        return hashlib.sha1(
+            "\0".join([self.fingerprint(code_snapshot_file), self.settings, normalized_query]).encode('utf-8')
+        ).hexdigest()
+
+    def get(self, key):
+        value = self.store.get(key)
+        return None if value is None else json.loads(value)
+
+    def put(self, key, hits):
+        self.store.put(key, json.dumps(hits).encode('utf-8'))
+
+
+def normalize_query(query, tokenizer=None, raw=False):
+    """
+    Cache key text for a query: its terms, plus the whitespace-normalized
+    text when the retriever also reads the raw query (dense embeddings).
+    """
+    terms = getattr(tokenizer, 'tokenize_query', tokenizer or tokenize)(query)
+    normalized = "\n".join(terms)
+    if raw:
+        normalized += "\0" + " ".join(query.split())
+    return normalized
+
+
+# --query_cache_dir일 때 프로세스마다 하나씩 여는 결과 캐시
+_query_cache = None
+
+
+def process_group(
+    group,
+    backend="python",
+    k1=1.5,
+    b=0.75,
+    index_dir=None,
+    incremental=False,
+    prune=False,
+    tokenizer_options=None,
+    dense_options=None,
+    chunking="file",
+    chunk_pool=100,
+    cache_options=None,
+    rerank_pool=20,
+    rerank_options=None,
+):
+    """
+    Retrieves files for PRs that share a base commit. Returns (results in group
+    order, stats) where stats holds the worker pid, PR count, elapsed time and
+    query cache hits / misses.
+    """
+    global _incremental_retriever, _query_cache
+    start_time = time.perf_counter()
+    if dense_options is not None:
+        retriever_class = get_hybrid_retriever_class(**dense_options)
+    else:
+        retriever_class = get_retriever_class(backend)
+    # 토크나이저(디스크 캐시 연결 포함)는 워커 프로세스 안에서 생성
+    tokenizer = get_tokenizer(**(tokenizer_options or {}))
+    if cache_options is not None and _query_cache is None:
+        _query_cache = QueryCache(**cache_options)
+    query_cache = _query_cache if cache_options is not None else None
+    reranker = PathReranker(**(rerank_options or {}))
+
+    # [pr_number, query, cache key, hits]; hits stay None until retrieved
+    entries = []
+    snapshot = None
+    for pr in group:
         pr_number = pr['number']
-        
+
         # Load code corpus for this specific PR
         code_snapshot_file = f'code_snapshots/pr_{pr_number}_code.json'
-        
+
         # Skip if code snapshot doesn't exist
         if not os.path.exists(code_snapshot_file):
             print(f"Warning: Code snapshot not found for PR {pr_number}, skipping...")
             continue
-            
-        with open(code_snapshot_file, 'r') as f:
-            code_corpus = json.load(f)
-        
-        # Convert code_corpus to list format for BM25
-        documents = []
-        for file_path, content in code_corpus.items():
-            documents.append({
-                'docid': file_path,
-                'content': content
-            })
-        
-        # Skip if no documents
-        if not documents:
-            print(f"Warning: No documents found for PR {pr_number}, skipping...")
-            continue
-        
-        # Initialize and fit BM25 for this PR
-        retriever = BM25Retriever(k1=1.5, b=0.75)
-        retriever.fit(documents)
-        
-        # Create query from PR title and body
-        title = pr.get('title', '')
-        body = pr.get('body', '')
-        query = f"{title} {body}".strip()
-        
+
+        query = make_query(pr)
+
         # Skip if no query content
         if not query:
             print(f"Warning: No query content for PR {pr_number}, skipping...")
             continue
-        
-        # Tokenize query for file path matching
-        query_terms = re.findall(r'\b\w+\b', query.lower())
-        
+
+        cache_key = hits = None
+        if query_cache is not None:
+            cache_key = query_cache.key(
+                code_snapshot_file,
+                normalize_query(query, tokenizer, raw=dense_options is not None),
+            )
+            hits = query_cache.get(cache_key)
+        if hits is None and snapshot is None:
+            snapshot = (pr, code_snapshot_file)
+        entries.append([pr_number, query, cache_key, hits])
+
+    # 캐시에 없는 쿼리가 있을 때만 인덱스를 만들거나 불러옴
+    misses = [entry for entry in entries if entry[3] is None]
+    retriever = None
+    if misses:
+        pr, code_snapshot_file = snapshot
+        pr_number = pr['number']
+        # Initialize and fit (or load) BM25 once for every PR on this snapshot
+        if incremental:
+            if _incremental_retriever is None:
+                _incremental_retriever = IncrementalBM25Retriever(k1=k1, b=b, tokenizer=tokenizer)
+            added, removed = _incremental_retriever.update(DOCUMENT_SOURCES[chunking](code_snapshot_file))
+            print(f"PR {pr_number}: index updated (+{added} / -{removed} files)")
+            retriever = _incremental_retriever
+        else:
+            index_file = None
+            if index_dir is not None:
+                # 토크나이저마다 다른 파일에 저장 (기본 토크나이저와 file 청킹은 기존 이름 유지)
+                suffix = ".bm25" if chunking == "file" else f".{chunking}.bm25"
+                if tokenizer is not None:
+                    suffix = f".{tokenizer_signature(tokenizer)}{suffix}"
+                index_file = os.path.join(index_dir, f"{pr.get('base_sha') or pr_number}{suffix}")
+            retriever = open_retriever(
+                retriever_class,
+                code_snapshot_file,
+                index_file,
+                k1=k1,
+                b=b,
+                tokenizer=tokenizer,
+                chunking=chunking,
+            )
+
+    # Skip if no documents
+    if retriever is not None and retriever.N == 0:
+        for pr_number, _, _, _ in misses:
+            print(f"Warning: No documents found for PR {pr_number}, skipping...")
+        entries = [entry for entry in entries if entry[3] is not None]
+        misses = []
+
+    if misses:
         # Search for relevant files
-        hits = retriever.search(query, top_k=20)  # 3에서 10으로 증가 - 더 많은 후보
-        
-        # 파일 경로에 가중치 부여 (더 관련성 높은 파일 우선)
-        for hit in hits:
-            file_path = hit['docid']
-            # 패치가 수정하는 파일이면 우선순위 높임
-            if any(term.lower() in file_path.lower() for term in query_terms):
-                hit['score'] *= 2.0  # 가중치 증가
-            # 파일 경로에 키워드가 포함되어 있으면 추가 가중치
-            if any(keyword in file_path.lower() for keyword in ['test', 'example', 'demo']):
-                hit['score'] *= 0.5  # 테스트 파일은 낮은 우선순위
-        
-        # 상위 5개만 선택
-        hits = sorted(hits, key=lambda x: x['score'], reverse=True)[:5]
-        
-        # Create result entry
-        result = {
+        queries = [query for _, query, _, _ in misses]
+        search_kwargs = {'prune': True} if prune else {}
+        if chunking == "file":
+            all_hits = retriever.search_batch(queries, top_k=rerank_pool, **search_kwargs)  # 3에서 10으로 증가 - 더 많은 후보
+        else:
+            # 청크 단위로 넉넉히 검색한 뒤 파일 단위로 합침
+            all_hits = [
+                aggregate_chunk_hits(chunk_hits, top_k=rerank_pool)
+                for chunk_hits in retriever.search_batch(queries, top_k=chunk_pool, **search_kwargs)
+            ]
+        for entry, hits in zip(misses, all_hits):
+            entry[3] = hits
+            if query_cache is not None:
+                query_cache.put(entry[2], hits)
+
+    results = []
+    for pr_number, query, _, hits in entries:
+        results.append({
             'instance_id': f"MONAI_{pr_number}",
-            'hits': hits
-        }
-        results.append(result)
-    
-    # Save results
-    with open('bm25_text_results.jsonl', 'w') as f:
-        for result in results:
-            f.write(json.dumps(result) + '\n')
+            'hits': reranker.rerank(hits, query)
+        })
+
+    stats = {
+        'pid': os.getpid(),
+        'prs': len(group),
+        'seconds': time.perf_counter() - start_time,
+        'cache_hits': len(entries) - len(misses) if query_cache is not None else 0,
+        'cache_misses': len(misses) if query_cache is not None else 0,
+    }
+    return results, stats
+
+
+def load_finished_ids(output_file):
+    """
+    Returns the instance_ids already written to output_file. A torn line left
+    by an interrupted run (and anything after it) is truncated so it is redone.
+    """
+    finished_ids = set()
+    if not os.path.exists(output_file):
+        return finished_ids
+    with open(output_file, 'rb+') as f:
+        offset = 0
+        for line in f:
+            try:
+                if not line.endswith(b'\n'):
+                    raise ValueError("incomplete line")
+                finished_ids.add(json.loads(line)['instance_id'])
+            except (ValueError, KeyError):
+                print(f"Warning: Truncating {output_file} at a torn line, it will be redone")
+                f.truncate(offset)
+                break
+            offset += len(line)
+    return finished_ids
+
+
+def report_throughput(worker_stats, elapsed):
+    for pid, stats in sorted(worker_stats.items()):
+        rate = stats['prs'] / stats['seconds'] if stats['seconds'] > 0 else 0
+        print(f"Worker {pid}: {stats['prs']} PRs in {stats['seconds']:.1f}s ({rate:.2f} PRs/s)")
+    total = sum(stats['prs'] for stats in worker_stats.values())
+    print(f"Total: {total} PRs in {elapsed:.1f}s ({total / elapsed if elapsed > 0 else 0:.2f} PRs/s)")
+    cache_hits = sum(stats['cache_hits'] for stats in worker_stats.values())
+    cache_misses = sum(stats['cache_misses'] for stats in worker_stats.values())
+    if cache_hits or cache_misses:
+        print(
+            f"Query cache: {cache_hits} hits / {cache_misses} misses "
+            f"({cache_hits / (cache_hits + cache_misses):.0%} hit rate)"
+        )
+
+
+def main(
+    backend="python",
+    k1=1.5,
+    b=0.75,
+    index_dir=None,
+    incremental=False,
+    num_workers=1,
+    output_file='bm25_text_results.jsonl',
+    resume=False,
+    prune=False,
+    tokenizer="default",
+    strip_comments=False,
+    strip_strings=False,
+    token_cache_dir=None,
+    dense_model=None,
+    dense_index_dir="dense_index",
+    ann="exact",
+    nprobe=8,
+    fusion_pool=100,
+    rrf_k=60,
+    chunking="file",
+    chunk_pool=100,
+    query_cache_dir=None,
+    query_cache_size_mb=1024,
+    rerank_pool=20,
+    rerank_top_k=5,
+    path_boost=2.0,
+    test_penalty=0.5,
+    penalty_keywords=",".join(PENALTY_KEYWORDS),
+    path_overlap_weight=0.0,
+):
+    # Load filtered PRs
+    with open('filtered_prs.json', 'r') as f:
+        filtered_prs = json.load(f)
+    if index_dir is not None:
+        os.makedirs(index_dir, exist_ok=True)
+    if incremental:
+        # 모든 PR이 (워커마다) 하나의 인덱스를 공유하고 스냅샷 사이의 변경분만 반영
+        assert backend == "python" and index_dir is None, (
+            "--incremental only works with the python backend and without --index_dir"
+        )
+    if prune:
+        assert backend == "python", "--prune only works with the python backend"
+    if dense_model is not None:
+        assert backend == "python" and not incremental and index_dir is None, (
+            "--dense_model only works with the python backend, without --incremental or --index_dir"
+        )
+    if tokenizer == "default":
+        assert not (strip_comments or strip_strings or token_cache_dir), (
+            "--strip_comments, --strip_strings and --token_cache_dir need --tokenizer code"
+        )
+
+    # Skip PRs already in the output when resuming
+    finished_ids = load_finished_ids(output_file) if resume else set()
+    if finished_ids:
+        print(f"Found {len(finished_ids)} already processed PRs in {output_file}")
+    remaining_prs = [
+        pr for pr in filtered_prs if f"MONAI_{pr['number']}" not in finished_ids
+    ]
+
+    # Process PRs grouped by corpus so every query on a snapshot is scored in one call
+    groups = group_by_base_commit(remaining_prs)
+    options = dict(
+        backend=backend,
+        k1=k1,
+        b=b,
+        index_dir=index_dir,
+        incremental=incremental,
+        prune=prune,
+        tokenizer_options=dict(
+            tokenizer=tokenizer,
+            strip_comments=strip_comments,
+            strip_strings=strip_strings,
+            token_cache_dir=token_cache_dir,
+        ),
+        dense_options=None if dense_model is None else dict(
+            model=dense_model,
+            index_dir=dense_index_dir,
+            ann=ann,
+            nprobe=nprobe,
+            pool_size=fusion_pool,
+            rrf_k=rrf_k,
+        ),
+        chunking=chunking,
+        chunk_pool=chunk_pool,
+        rerank_pool=rerank_pool,
+        rerank_options=dict(
+            path_boost=path_boost,
+            test_penalty=test_penalty,
+            penalty_keywords=[keyword for keyword in penalty_keywords.split(",") if keyword],
+            overlap_weight=path_overlap_weight,
+            top_k=rerank_top_k,
+        ),
+    )
+    if query_cache_dir is not None:
+        # 결과를 바꾸는 설정만 키에 포함 (--prune, --incremental, --index_dir은 같은 결과)
+        settings = dict(
+            backend=backend,
+            k1=k1,
+            b=b,
+            tokenizer=tokenizer,
+            strip_comments=strip_comments,
+            strip_strings=strip_strings,
+            chunking=chunking,
+            chunk_pool=chunk_pool if chunking != "file" else None,
+            dense=options['dense_options'],
+            top_k=rerank_pool,
+        )
+        options['cache_options'] = dict(
+            cache_dir=query_cache_dir, settings=settings, max_mb=query_cache_size_mb
+        )
+
+    worker_stats = defaultdict(lambda: {'prs': 0, 'seconds': 0.0, 'cache_hits': 0, 'cache_misses': 0})
+    start_time = time.perf_counter()
+    # Results are streamed to the output as soon as each group finishes
+    with open(output_file, 'a' if resume else 'w') as f:
+
+        def write_results(results, stats):
+            for result in results:
+                f.write(json.dumps(result) + '\n')
+            f.flush()
+            worker_stats[stats['pid']]['prs'] += stats['prs']
+            worker_stats[stats['pid']]['seconds'] += stats['seconds']
+            worker_stats[stats['pid']]['cache_hits'] += stats['cache_hits']
+            worker_stats[stats['pid']]['cache_misses'] += stats['cache_misses']
+
+        if num_workers <= 1:
+            for group in groups:
+                write_results(*process_group(group, **options))
+        else:
+            with ProcessPoolExecutor(max_workers=num_workers) as executor:
+                futures = [
+                    executor.submit(process_group, group, **options) for group in groups
+                ]
+                for future in as_completed(futures):
+                    write_results(*future.result())
+
+    report_throughput(worker_stats, time.perf_counter() - start_time)
 
 if __name__ == "__main__":
-    main()
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--backend",
+        type=str,
+        default="python",
+        choices=["python", "sparse"],
+        help="BM25 engine: pure-Python inverted index or NumPy/SciPy sparse matrix.",
+    )
+    parser.add_argument("--k1", type=float, default=1.5)
+    parser.add_argument("--b", type=float, default=0.75)
+    parser.add_argument(
+        "--index_dir",
+        type=str,
+        default=None,
+        help="Directory of saved BM25 indexes (one per base commit, chunking and tokenizer). Missing indexes are built and saved.",
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Share one index across PRs and only re-index files whose blob changed between snapshots.",
+    )
+    parser.add_argument(
+        "--num_workers",
+        type=int,
+        default=1,
+        help="Number of worker processes. PRs sharing a base commit go to the same worker.",
+    )
+    parser.add_argument("--output_file", type=str, default="bm25_text_results.jsonl")
+    parser.add_argument(
+        "--prune",
+        action="store_true",
+        help="Use MaxScore dynamic pruning for top-k (same results; queries with many distinct terms are scored exhaustively).",
+    )
+    parser.add_argument(
+        "--tokenizer",
+        type=str,
+        default="default",
+        choices=["default", "code"],
+        help="default: lower-cased \\w+ words. code: also split camelCase / snake_case identifiers.",
+    )
+    parser.add_argument(
+        "--strip_comments",
+        action="store_true",
+        help="Drop comments from Python files before tokenizing (--tokenizer code).",
+    )
+    parser.add_argument(
+        "--strip_strings",
+        action="store_true",
+        help="Drop string literals, docstrings included, from Python files (--tokenizer code).",
+    )
+    parser.add_argument(
+        "--token_cache_dir",
+        type=str,
+        default=None,
+        help="On-disk LRU cache of token streams keyed by blob SHA (--tokenizer code).",
+    )
+    parser.add_argument(
+        "--chunking",
+        type=str,
+        default="file",
+        choices=["file", "ast"],
+        help="Index whole files, or functions / classes / module headers (hits then carry line spans).",
+    )
+    parser.add_argument(
+        "--chunk_pool",
+        type=int,
+        default=100,
+        help="Chunks retrieved per query before they are aggregated to files (--chunking ast).",
+    )
+    parser.add_argument(
+        "--dense_model",
+        type=str,
+        default=None,
+        help="Local embedding model directory. Enables hybrid BM25 + dense retrieval fused with RRF.",
+    )
+    parser.add_argument(
+        "--dense_index_dir",
+        type=str,
+        default="dense_index",
+        help="Chunk embeddings keyed by blob SHA, shared across snapshots (--dense_model).",
+    )
+    parser.add_argument(
+        "--ann",
+        type=str,
+        default="exact",
+        choices=["exact", "ivf"],
+        help="Dense search: exact or IVF approximate nearest neighbours (--dense_model).",
+    )
+    parser.add_argument("--nprobe", type=int, default=8, help="IVF clusters searched per query (--ann ivf).")
+    parser.add_argument(
+        "--fusion_pool",
+        type=int,
+        default=100,
+        help="Number of BM25 and dense results fused per query (--dense_model).",
+    )
+    parser.add_argument("--rrf_k", type=int, default=60, help="Reciprocal rank fusion constant (--dense_model).")
+    parser.add_argument(
+        "--rerank_pool",
+        type=int,
+        default=20,
+        help="Number of retrieved files passed to the path-aware re-ranker (e.g. 500).",
+    )
+    parser.add_argument("--rerank_top_k", type=int, default=5, help="Number of files kept after re-ranking.")
+    parser.add_argument(
+        "--path_boost",
+        type=float,
+        default=2.0,
+        help="Score multiplier for files whose path contains a query term.",
+    )
+    parser.add_argument(
+        "--test_penalty",
+        type=float,
+        default=0.5,
+        help="Score multiplier for files whose path contains a penalty keyword.",
+    )
+    parser.add_argument(
+        "--penalty_keywords",
+        type=str,
+        default=",".join(PENALTY_KEYWORDS),
+        help="Comma-separated path keywords that get --test_penalty.",
+    )
+    parser.add_argument(
+        "--path_overlap_weight",
+        type=float,
+        default=0.0,
+        help="Extra boost of 1 + weight * (share of path words that are query terms).",
+    )
+    parser.add_argument(
+        "--query_cache_dir",
+        type=str,
+        default=None,
+        help="Cache retrieved hits by snapshot content, settings and query so repeated runs skip indexing.",
+    )
+    parser.add_argument("--query_cache_size_mb", type=int, default=1024)
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="Append to output_file and skip PRs whose instance_id is already in it.",
+    )
+    main(**vars(parser.parse_args()))
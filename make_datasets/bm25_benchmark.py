@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+BM25 top-k 모드별 쿼리 지연 시간을 비교합니다 (exhaustive vs MaxScore 가지치기).
+filtered_prs.json의 PR 제목+본문을 쿼리로, code_snapshots를 코퍼스로 사용하며
+두 모드의 결과가 같은지도 함께 확인합니다.
+"""
+
+import json
+import os
+import time
+from argparse import ArgumentParser
+
+from bm25 import (
+    BM25Retriever,
+    group_by_base_commit,
+    iter_documents,
+    make_query,
+    tokenize,
+)
+
+
+def time_search(retriever, query, top_k, repeat, **kwargs):
+    best = None
+    for _ in range(repeat):
+        # bm25.py는 스냅샷마다 쿼리 하나를 처리하므로 가중치 캐시가 빈 상태에서 측정
+        retriever.reset_caches()
+        start_time = time.perf_counter()
+        hits = retriever.search(query, top_k=top_k, **kwargs)
+        elapsed = time.perf_counter() - start_time
+        best = elapsed if best is None else min(best, elapsed)
+    return hits, best
+
+
+def percentile(values, q):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(q * (len(values) - 1))))]
+
+
+def summarize(records):
+    exhaustive = [record['exhaustive_ms'] for record in records]
+    pruned = [record['maxscore_ms'] for record in records]
+    return {
+        'queries': len(records),
+        'exhaustive_mean_ms': sum(exhaustive) / len(exhaustive) if records else 0.0,
+        'maxscore_mean_ms': sum(pruned) / len(pruned) if records else 0.0,
+        'exhaustive_p50_ms': percentile(exhaustive, 0.5),
+        'maxscore_p50_ms': percentile(pruned, 0.5),
+        'exhaustive_p95_ms': percentile(exhaustive, 0.95),
+        'maxscore_p95_ms': percentile(pruned, 0.95),
+        'speedup': sum(exhaustive) / sum(pruned) if records and sum(pruned) > 0 else 0.0,
+    }
+
+
+def main(filtered_prs_file, snapshot_dir, top_k, repeat, long_query_terms, output_file):
+    with open(filtered_prs_file, 'r') as f:
+        filtered_prs = json.load(f)
+
+    records = []
+    for group in group_by_base_commit(filtered_prs):
+        retriever = None
+        for pr in group:
+            pr_number = pr['number']
+            code_snapshot_file = os.path.join(snapshot_dir, f'pr_{pr_number}_code.json')
+            query = make_query(pr)
+            if not query or not os.path.exists(code_snapshot_file):
+                continue
+            if retriever is None:
+                retriever = BM25Retriever()
+                retriever.fit(iter_documents(code_snapshot_file))
+            if retriever.N == 0:
+                continue
+
+            exhaustive_hits, exhaustive_time = time_search(retriever, query, top_k, repeat)
+            pruned_hits, pruned_time = time_search(retriever, query, top_k, repeat, prune=True)
+            if exhaustive_hits != pruned_hits:
+                raise AssertionError(f"Pruned results differ from exhaustive scoring for PR {pr_number}")
+
+            records.append({
+                'instance_id': f"MONAI_{pr_number}",
+                'num_docs': retriever.N,
+                'query_terms': len(tokenize(query)),
+                'exhaustive_ms': exhaustive_time * 1000,
+                'maxscore_ms': pruned_time * 1000,
+            })
+
+    long_records = [record for record in records if record['query_terms'] >= long_query_terms]
+    report = {
+        'top_k': top_k,
+        'long_query_terms': long_query_terms,
+        'all_queries': summarize(records),
+        'long_queries': summarize(long_records),
+        'per_query': records,
+    }
+    for name in ['all_queries', 'long_queries']:
+        summary = report[name]
+        print(
+            f"{name}: {summary['queries']} queries, "
+            f"exhaustive {summary['exhaustive_mean_ms']:.2f} ms, "
+            f"MaxScore {summary['maxscore_mean_ms']:.2f} ms (x{summary['speedup']:.2f})"
+        )
+    if output_file is not None:
+        with open(output_file, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument("--filtered_prs_file", type=str, default="filtered_prs.json")
+    parser.add_argument("--snapshot_dir", type=str, default="code_snapshots")
+    parser.add_argument("--top_k", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per query; the fastest is kept.")
+    parser.add_argument(
+        "--long_query_terms",
+        type=int,
+        default=100,
+        help="Queries with at least this many tokens are reported separately as long queries.",
+    )
+    parser.add_argument("--output_file", type=str, default=None, help="Optional JSON report path.")
+    main(**vars(parser.parse_args()))
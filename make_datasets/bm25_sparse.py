@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+NumPy/SciPy CSR 행렬 기반 BM25. bm25.BM25Retriever와 같은 점수식을 쓰지만
+문서 x 어휘 가중치 행렬을 한 번 만들어 두고 여러 쿼리를 한 번의 희소 행렬 곱으로 채점합니다.
+"""
+
+import numpy as np
+from scipy import sparse
+
+from bm25 import BM25Retriever
+
+
+class SparseBM25Retriever(BM25Retriever):
+    """
+    BM25Retriever with a precomputed BM25 weight matrix, stored transposed
+    (vocab x docs) so that scoring a batch of queries is a single CSR product.
+
+    Scores are summed by the sparse product instead of term by term, so they
+    can differ from BM25Retriever in the last floating point bits.
+    """
+
+    def __init__(self, k1=1.5, b=0.75, tokenizer=None, batch_size=256):
+        super().__init__(k1=k1, b=b, tokenizer=tokenizer)
+        self.batch_size = batch_size
+        self.vocab = {}
+        self.matrix = None
+
+    def fit(self, documents):
+        super().fit(documents)
+        self.build_matrix()
+
+    @classmethod
+    def load(cls, path, mmap=True, k1=None, b=None, tokenizer=None):
+        retriever = super().load(path, mmap=mmap, k1=k1, b=b, tokenizer=tokenizer)
+        retriever.build_matrix()
+        return retriever
+
+    def build_matrix(self):
+        terms = list(self.postings)
+        self.vocab = {term: col for col, term in enumerate(terms)}
+
+        idf = np.array([self.idf(term) for term in terms], dtype=np.float64)
+        counts = np.array([len(self.postings[term][0]) for term in terms], dtype=np.int64)
+        cols = np.repeat(np.arange(len(terms), dtype=np.int64), counts)
+        rows = np.fromiter(
+            (doc_idx for term in terms for doc_idx in self.postings[term][0]),
+            dtype=np.int64,
+            count=int(counts.sum()),
+        )
+        tfs = np.fromiter(
+            (tf for term in terms for tf in self.postings[term][1]),
+            dtype=np.float64,
+            count=int(counts.sum()),
+        )
+
+        doc_lengths = np.asarray(self.doc_lengths, dtype=np.float64)
+        avg_doc_length = self.avg_doc_length if self.avg_doc_length > 0 else 1
+        length_norm = self.k1 * (1 - self.b + self.b * (doc_lengths / avg_doc_length))
+        denominator = tfs + length_norm[rows]
+        weights = np.zeros_like(tfs)
+        positive = denominator > 0
+        weights[positive] = idf[cols[positive]] * (
+            tfs[positive] * (self.k1 + 1) / denominator[positive]
+        )
+
+        self.matrix = sparse.csr_matrix(
+            (weights, (cols, rows)), shape=(len(terms), self.N)
+        )
+
+    def query_matrix(self, queries):
+        """
+        Encodes queries as a (queries x vocab) CSR matrix of term counts.
+        Repeated query terms count once per occurrence, like BM25Retriever.
+        """
+        rows, cols = [], []
+        for row, query in enumerate(queries):
+            for term in self.tokenize_query(query):
+                col = self.vocab.get(term)
+                if col is not None:
+                    rows.append(row)
+                    cols.append(col)
+        data = np.ones(len(rows), dtype=np.float64)
+        return sparse.csr_matrix(
+            (data, (rows, cols)), shape=(len(queries), len(self.vocab))
+        )
+
+    def _top_k_indices(self, scores, top_k):
+        k = min(top_k, len(scores))
+        if k <= 0:
+            return np.empty(0, dtype=np.int64)
+        if k < len(scores):
+            kth = np.partition(-scores, k - 1)[k - 1]
+            above = np.flatnonzero(-scores < kth)
+            # 경계 점수가 같은 문서는 문서 순서대로 채워 BM25Retriever와 같은 tie 순서 유지
+            tied = np.flatnonzero(-scores == kth)[: k - len(above)]
+            candidates = np.concatenate([above, tied])
+        else:
+            candidates = np.arange(len(scores))
+        order = np.lexsort((candidates, -scores[candidates]))
+        return candidates[order]
+
+    def search_batch(self, queries, top_k=20):
+        """
+        queries: list of query strings scored against the same corpus
+        """
+        results = []
+        for start in range(0, len(queries), self.batch_size):
+            batch = queries[start : start + self.batch_size]
+            scores = (self.query_matrix(batch) @ self.matrix).toarray()
+            for row in scores:
+                results.append([
+                    {
+                        'docid': self.documents[doc_idx]['docid'],
+                        'score': float(row[doc_idx])
+                    }
+                    for doc_idx in self._top_k_indices(row, top_k)
+                ])
+        return results
+
+    def search(self, query, top_k=20):
+        return self.search_batch([query], top_k=top_k)[0]
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+BM25 인덱싱용 코드 토크나이저. camelCase / snake_case 식별자를 나누고, 필요하면 주석과
+문자열을 제거하며, 파일 내용 해시별 토큰 결과를 디스크 LRU 캐시에 저장해 같은 파일을 다시 토큰화하지 않습니다.
+"""
+
+import io
+import os
+import re
+import tokenize as py_tokenize
+import zlib
+
+from bm25 import TOKEN_PATTERN, git_blob_sha
+from disk_cache import DiskLRUCache
+
+# HTTPServer -> HTTP, Server / SpatialCropd -> Spatial, Cropd / conv3d -> conv, 3, d
+SUBTOKEN_PATTERN = re.compile(r'[A-Z]+(?![a-z])|[A-Z]?[a-z]+|\d+')
+
+# Python 3.12부터 f-string은 FSTRING_START / MIDDLE / END 토큰으로 나뉨
+STRING_TOKENS = {py_tokenize.STRING} | {
+    getattr(py_tokenize, name) for name in ['FSTRING_MIDDLE'] if hasattr(py_tokenize, name)
+}
+
+
+def split_identifier(identifier):
+    """
+    Splits a camelCase / snake_case identifier into lower-cased parts.
+    Identifiers without letters a-z (e.g. Korean words) come back whole.
+    """
+    parts = [part.lower() for part in SUBTOKEN_PATTERN.findall(identifier)]
+    return parts or [identifier.lower()]
+
+
+def strip_source(text, comments=True, strings=False):
+    """
+    Removes comments and/or string literals from Python source. Text that
+    is not valid Python is returned unchanged.
+    """
+    drop = set()
+    if comments:
+        drop.add(py_tokenize.COMMENT)
+    if strings:
+        drop |= STRING_TOKENS
+    try:
+        kept = [
+            token.string
+            for token in py_tokenize.generate_tokens(io.StringIO(text).readline)
+            if token.type not in drop
+        ]
+    except (py_tokenize.TokenError, SyntaxError):
+        return text
+    return " ".join(kept)
+
+
+class CodeTokenizer:
+    """
+    Document tokenizer for BM25Retriever. Every \\w+ word is kept whole (so
+    exact identifier matches still count) and, when it is a compound
+    identifier, followed by its camelCase / snake_case parts. Comments and
+    string literals can be stripped from Python files before tokenizing.
+
+    With cache_dir set, token streams are memoized on disk by git blob SHA,
+    so a file that is unchanged across snapshots is tokenized exactly once.
+    """
+
+    def __init__(
+        self,
+        split_identifiers=True,
+        strip_comments=False,
+        strip_strings=False,
+        cache_dir=None,
+        cache_size_mb=1024,
+    ):
+        self.split_identifiers = split_identifiers
+        self.strip_comments = strip_comments
+        self.strip_strings = strip_strings
+        self.signature = "code-{}{}{}".format(
+            int(split_identifiers), int(strip_comments), int(strip_strings)
+        )
+        self.cache = None
+        if cache_dir is not None:
+            self.cache = DiskLRUCache(
+                os.path.join(cache_dir, "tokens.sqlite"), max_bytes=cache_size_mb << 20
+            )
+
+    def _tokenize(self, text, strip=True):
+        if strip and (self.strip_comments or self.strip_strings):
+            text = strip_source(text, comments=self.strip_comments, strings=self.strip_strings)
+        if not self.split_identifiers:
+            return TOKEN_PATTERN.findall(text.lower())
+        terms = []
+        for word in TOKEN_PATTERN.findall(text):
+            compound = word.lower()
+            terms.append(compound)
+            parts = split_identifier(word)
+            if len(parts) > 1:
+                terms.extend(parts)
+        return terms
+
+    def __call__(self, text):
+        if self.cache is None:
+            return self._tokenize(text)
+        key = f"{self.signature}:{git_blob_sha(text)}"
+        cached = self.cache.get(key)
+        if cached is not None:
+            data = zlib.decompress(cached).decode('utf-8')
+            return data.split("\n") if data else []
+        terms = self._tokenize(text)
+        # \w+ 토큰에는 줄바꿈이 없으므로 줄 단위로 저장
+        self.cache.put(key, zlib.compress("\n".join(terms).encode('utf-8'), 1))
+        return terms
+
+    def tokenize_query(self, query):
+        # PR 본문은 코드가 아니므로 주석(# 제목 등)이나 문자열을 지우지 않음
+        return self._tokenize(query, strip=False)
+
@@ -2,21 +2,32 @@ import json
 import logging
 import os
 import traceback
+from collections import OrderedDict
 from copy import deepcopy
+from multiprocessing import Pool
 from pathlib import Path
 from tempfile import TemporaryDirectory
 import unidiff
 from tqdm.auto import tqdm
 
+from swebench.inference.make_datasets.progress_index import ProgressFile
 from swebench.inference.make_datasets.tokenize_dataset import TOKENIZER_FUNCS
 from swebench.inference.make_datasets.utils import (
     AutoContextManager,
+    BLOB_CACHE,
+    WorktreePool,
+    close_tree_readers,
+    git_blob_sha,
     ingest_directory_contents,
 )
 
 logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
 logger = logging.getLogger(__name__)
 
+# file_source "all"에서 저장소 파일을 동시에 읽는 전체 스레드 수 (콜드 캐시, 네트워크 파일시스템에서 효과)
+# 작업 프로세스가 여럿이면 프로세스끼리 나눠 가짐
+INGEST_WORKERS = 8
+
 
 PATCH_EXAMPLE = """--- a/file.py
 +++ b/file.py
@@ -124,16 +135,84 @@ def add_lines(content):
     return "\n".join(add_lines_list(content))
 
 
-def make_code_text(files_dict, add_line_numbers=True):
-    all_text = ""
-    for filename, contents in sorted(files_dict.items()):
-        all_text += f"[start of {filename}]\n"
-        if add_line_numbers:
-            all_text += add_lines(contents)
+def merge_spans(spans):
+    merged = []
+    for start, end in sorted(spans):
+        if merged and start <= merged[-1][1] + 1:
+            merged[-1][1] = max(merged[-1][1], end)
         else:
-            all_text += contents
-        all_text += f"\n[end of {filename}]\n"
-    return all_text.strip("\n")
+            merged.append([start, end])
+    return merged
+
+
+def make_span_text(contents, spans, add_line_numbers=True):
+    """
+    Renders only the given 1-based, inclusive line spans of contents, with
+    "..." where lines are left out. Line numbers stay those of the file.
+    """
+    lines = add_lines_list(contents) if add_line_numbers else contents.split("\n")
+    parts = []
+    last_end = 0
+    for start, end in merge_spans(spans):
+        if start > last_end + 1:
+            parts.append("...")
+        parts.extend(lines[start - 1 : end])
+        last_end = end
+    if last_end < len(lines):
+        parts.append("...")
+    return "\n".join(parts)
+
+
+# (blob sha, add_line_numbers, spans) -> 파일 하나의 렌더링 결과
+_RENDER_CACHE = OrderedDict()
+_RENDER_CACHE_MAX_CHARS = 1 << 26
+_render_cache_chars = 0
+
+
+def render_file(contents, add_line_numbers=True, spans=None):
+    """
+    Body of one file in a code block: the contents, optionally with line
+    numbers and cut down to spans. Numbered renderings are cached by blob
+    SHA, so a file shared by many instances is numbered once.
+    """
+    global _render_cache_chars
+    if not spans and not add_line_numbers:
+        return contents
+    key = (
+        git_blob_sha(contents.encode("utf-8", "surrogatepass")),
+        add_line_numbers,
+        tuple(map(tuple, spans)) if spans else None,
+    )
+    text = _RENDER_CACHE.get(key)
+    if text is not None:
+        _RENDER_CACHE.move_to_end(key)
+        return text
+    if spans:
+        # 청크 검색(--chunking ast)으로 찾은 부분만 포함
+        text = make_span_text(contents, spans, add_line_numbers)
+    else:
+        text = add_lines(contents)
+    _RENDER_CACHE[key] = text
+    _render_cache_chars += len(text)
+    while _render_cache_chars > _RENDER_CACHE_MAX_CHARS and len(_RENDER_CACHE) > 1:
+        _render_cache_chars -= len(_RENDER_CACHE.popitem(last=False)[1])
+    return text
+
+
+def iter_code_text(files_dict, add_line_numbers=True, file_spans=None):
+    """
+    Yields the pieces of make_code_text in order, so a prompt is joined
+    once instead of through repeated string concatenation.
+    """
+    for ix, (filename, contents) in enumerate(sorted(files_dict.items())):
+        spans = file_spans.get(filename) if file_spans else None
+        yield f"\n[start of {filename}]\n" if ix else f"[start of {filename}]\n"
+        yield render_file(contents, add_line_numbers, spans)
+        yield f"\n[end of {filename}]"
+
+
+def make_code_text(files_dict, add_line_numbers=True, file_spans=None):
+    return "".join(iter_code_text(files_dict, add_line_numbers, file_spans))
 
 
 def make_code_text_edits_only(files_dict, patch, add_line_numbers=True):
@@ -146,148 +225,305 @@ def make_code_text_edits_only(files_dict, patch, add_line_numbers=True):
             start = hunk.source_start - 15
             end = start + hunk.source_length + 15
             files[source_file].append((start, end))
-    all_text = ""
+    sections = []
     for filename, content in files_dict.items():
-        all_text += f"[start of {filename}]\n"
+        section = [f"[start of {filename}]\n"]
         content_with_lines = add_lines_list(content)
         for start, end in files[filename]:
             if start > 0:
-                all_text += "...\n"
-            all_text += "\n".join(content_with_lines[start:end])
-            all_text += "\n"
+                section.append("...\n")
+            section.append("\n".join(content_with_lines[start:end]))
+            section.append("\n")
             if end < len(content_with_lines):
-                all_text += "...\n"
-        all_text = all_text.strip("\n")
-        all_text += f"\n[end of {filename}]\n"
-    return all_text.strip("\n")
+                section.append("...\n")
+        # 파일마다 끝의 줄바꿈을 지우고 닫음 (섹션은 항상 "[start of"로 시작)
+        sections.append("".join(section).rstrip("\n") + f"\n[end of {filename}]")
+    return "\n".join(sections)
+
+
+class Slot(str):
+    """Name of a per-instance part of a PromptTemplate."""
+
+
+class PromptTemplate:
+    """
+    A prompt style compiled once: the "\\n"-joined lines of the prompt become
+    alternating static text and Slots, so rendering an instance only splices
+    its issue and code into pre-joined text. Token ids of the static
+    segments are computed once per tokenizer.
+    """
+
+    def __init__(self, lines, make_parts):
+        self.make_parts = make_parts
+        self.segments = []  # 정적 문자열 또는 Slot
+        static = []
+        for ix, line in enumerate(lines):
+            if ix:
+                static.append("\n")
+            if isinstance(line, Slot):
+                self.segments.append("".join(static))
+                self.segments.append(line)
+                static = []
+            else:
+                static.append(line)
+        self.segments.append("".join(static))
+        self.static_token_ids = {}  # tokenizer_name -> [정적 구간별 token ids]
+
+    def render(self, instance):
+        parts = self.make_parts(instance)
+        return "".join(
+            parts[segment] if isinstance(segment, Slot) else segment
+            for segment in self.segments
+        )
+
+    def get_static_token_ids(self, tokenizer_name, tokenizer, tokenizer_func):
+        if tokenizer_name not in self.static_token_ids:
+            self.static_token_ids[tokenizer_name] = [
+                tokenizer_func(segment, tokenizer)
+                for segment in self.segments
+                if not isinstance(segment, Slot)
+            ]
+        return self.static_token_ids[tokenizer_name]
+
+    def segment_lengths(self, instance, tokenizer_name, tokenizer, tokenizer_func, parts=None):
+        """
+        [(slot name or "static", token count)] for every segment, in order.
+        parts overrides some of the instance's slots (e.g. an empty code_text).
+        """
+        static_ids = iter(self.get_static_token_ids(tokenizer_name, tokenizer, tokenizer_func))
+        instance_parts = {**self.make_parts(instance), **(parts or {})}
+        lengths = []
+        for segment in self.segments:
+            if isinstance(segment, Slot):
+                text = instance_parts[segment]
+                lengths.append((str(segment), text_token_count(text, tokenizer_name, tokenizer, tokenizer_func)))
+            else:
+                lengths.append(("static", len(next(static_ids))))
+        return lengths
+
+    def token_count(self, instance, tokenizer_name, tokenizer, tokenizer_func, parts=None):
+        """
+        Tokens of the rendered prompt, summed over segments, plus one per
+        segment boundary for tokens that merge across it.
+        """
+        lengths = self.segment_lengths(instance, tokenizer_name, tokenizer, tokenizer_func, parts)
+        return sum(length for _, length in lengths) + len(lengths) - 1
+
+
+PROBLEM_STATEMENT = Slot("problem_statement")
+READMES_TEXT = Slot("readmes_text")
+CODE_TEXT = Slot("code_text")
+
+PREMISE = "You will be provided with a partial code base and an issue statement explaining a problem to resolve."
+PATCH_INSTRUCTIONS = (
+    "I need you to solve this issue by generating a single patch file that I can apply "
+    + "directly to this repository using git apply. Please respond with a single patch "
+    + "file in the following format."
+)
+
+
+def code_parts(instance):
+    return {
+        "problem_statement": instance["problem_statement"],
+        "readmes_text": make_code_text(instance["readmes"]),
+        "code_text": make_code_text(instance["file_contents"], file_spans=instance.get("file_spans")),
+    }
+
+
+def edits_only_parts(instance):
+    return {
+        "problem_statement": instance["problem_statement"],
+        "readmes_text": make_code_text(instance["readmes"]),
+        "code_text": make_code_text_edits_only(instance["file_contents"], instance["patch"]),
+    }
+
+
+def full_file_parts(instance):
+    return {
+        "problem_statement": instance["problem_statement"],
+        "readmes_text": make_code_text(instance["readmes"], add_line_numbers=False),
+        "code_text": make_code_text(instance["file_contents"], add_line_numbers=False),
+    }
+
+
+STYLE_2_LINES = [
+    PREMISE,
+    "<issue>",
+    PROBLEM_STATEMENT,
+    "</issue>",
+    "<code>",
+    READMES_TEXT,
+    CODE_TEXT,
+    "</code>",
+    PATCH_INSTRUCTIONS,
+    "<patch>",
+    PATCH_EXAMPLE,
+    "</patch>",
+]
+
+PROMPT_TEMPLATES = {
+    "style-2": PromptTemplate(STYLE_2_LINES, code_parts),
+    "style-2-edits-only": PromptTemplate(STYLE_2_LINES, edits_only_parts),
+    "style-3": PromptTemplate(
+        [
+            PREMISE,
+            "<issue>",
+            PROBLEM_STATEMENT,
+            "</issue>",
+            "",
+            "<code>",
+            READMES_TEXT,
+            CODE_TEXT,
+            "</code>",
+            "",
+            "Here is an example of a patch file. It consists of changes to the code base. "
+            + "It specifies the file names, the line numbers of each change, and the removed and added lines. "
+            + "A single patch file can contain changes to multiple files.",
+            "<patch>",
+            PATCH_EXAMPLE,
+            "</patch>",
+            "",
+            "I need you to solve the provided issue by generating a single patch file that I can apply "
+            + "directly to this repository using git apply. Please respond with a single patch "
+            + "file in the format shown above.",
+            "Respond below:",
+        ],
+        code_parts,
+    ),
+    "full_file_gen": PromptTemplate(
+        [
+            PREMISE,
+            "<issue>",
+            PROBLEM_STATEMENT,
+            "</issue>",
+            "<code>",
+            READMES_TEXT,
+            CODE_TEXT,
+            "</code>",
+            "I need you to solve this issue by regenerating the full files in the code base that you would like to change. "
+            + "You can change as many files as you like. "
+            + "Please respond with a list of files and their revised contents in the following format.",
+            "<example>",
+            FULL_GENERATION_EXAMPLE,
+            "</example>",
+        ],
+        full_file_parts,
+    ),
+}
 
 
 def prompt_style_2(instance):
-    premise = "You will be provided with a partial code base and an issue statement explaining a problem to resolve."
-    readmes_text = make_code_text(instance["readmes"])
-    code_text = make_code_text(instance["file_contents"])
-    instructions = (
-        "I need you to solve this issue by generating a single patch file that I can apply "
-        + "directly to this repository using git apply. Please respond with a single patch "
-        + "file in the following format."
-    )
-    problem_statement = instance["problem_statement"]
-    final_text = [
-        premise,
-        "<issue>",
-        problem_statement,
-        "</issue>",
-        "<code>",
-        readmes_text,
-        code_text,
-        "</code>",
-        instructions,
-        "<patch>",
-        PATCH_EXAMPLE,
-        "</patch>",
-    ]
-    final_text = "\n".join(final_text)
-    return final_text
+    return PROMPT_TEMPLATES["style-2"].render(instance)
 
 
 def prompt_style_2_edits_only(instance):
-    premise = "You will be provided with a partial code base and an issue statement explaining a problem to resolve."
-    readmes_text = make_code_text(instance["readmes"])
-    code_text = make_code_text_edits_only(instance["file_contents"], instance["patch"])
-    instructions = (
-        "I need you to solve this issue by generating a single patch file that I can apply "
-        + "directly to this repository using git apply. Please respond with a single patch "
-        + "file in the following format."
-    )
-    problem_statement = instance["problem_statement"]
-    final_text = [
-        premise,
-        "<issue>",
-        problem_statement,
-        "</issue>",
-        "<code>",
-        readmes_text,
-        code_text,
-        "</code>",
-        instructions,
-        "<patch>",
-        PATCH_EXAMPLE,
-        "</patch>",
-    ]
-    final_text = "\n".join(final_text)
-    return final_text
+    return PROMPT_TEMPLATES["style-2-edits-only"].render(instance)
 
 
 def prompt_style_3(instance):
-    premise = "You will be provided with a partial code base and an issue statement explaining a problem to resolve."
-    readmes_text = make_code_text(instance["readmes"])
-    code_text = make_code_text(instance["file_contents"])
-    example_explanation = (
-        "Here is an example of a patch file. It consists of changes to the code base. "
-        + "It specifies the file names, the line numbers of each change, and the removed and added lines. "
-        + "A single patch file can contain changes to multiple files."
-    )
-    final_instruction = (
-        "I need you to solve the provided issue by generating a single patch file that I can apply "
-        + "directly to this repository using git apply. Please respond with a single patch "
-        + "file in the format shown above."
-    )
-    problem_statement = instance["problem_statement"]
-    final_text = [
-        premise,
-        "<issue>",
-        problem_statement,
-        "</issue>",
-        "",
-        "<code>",
-        readmes_text,
-        code_text,
-        "</code>",
-        "",
-        example_explanation,
-        "<patch>",
-        PATCH_EXAMPLE,
-        "</patch>",
-        "",
-        final_instruction,
-        "Respond below:",
-    ]
-    final_text = "\n".join(final_text)
-    return final_text
+    return PROMPT_TEMPLATES["style-3"].render(instance)
 
 
 def full_file_gen(instance):
-    premise = "You will be provided with a partial code base and an issue statement explaining a problem to resolve."
-    readmes_text = make_code_text(instance["readmes"], add_line_numbers=False)
-    code_text = make_code_text(instance["file_contents"], add_line_numbers=False)
-    instructions = (
-        "I need you to solve this issue by regenerating the full files in the code base that you would like to change. "
-        + "You can change as many files as you like. "
-        + "Please respond with a list of files and their revised contents in the following format."
+    return PROMPT_TEMPLATES["full_file_gen"].render(instance)
+
+
+# prompt style별 코드 블록 렌더링 방식 (줄 번호, 청크 span 사용 여부)
+PROMPT_CODE_OPTIONS = {
+    "style-2": (True, True),
+    "style-3": (True, True),
+    "full_file_gen": (False, False),
+    # 실제로는 수정 부근만 들어가므로 전체 파일 비용은 상한값
+    "style-2-edits-only": (True, False),
+}
+
+# (tokenizer_name, filename, blob sha, add_line_numbers, spans) -> 코드 블록의 토큰 수
+# (tokenizer_name, blob sha) -> 프롬프트 부분(이슈, README)의 토큰 수
+_TOKEN_COUNT_CACHE = OrderedDict()
+_TOKEN_COUNT_CACHE_SIZE = 1 << 18
+
+
+def file_token_count(
+    filename, contents, add_line_numbers, spans, tokenizer_name, tokenizer, tokenizer_func
+):
+    """
+    Token count of the "[start of ...]" ... "[end of ...]" block of one file,
+    cached by content so each file is tokenized once per tokenizer.
+    """
+    key = (
+        tokenizer_name,
+        filename,
+        git_blob_sha(contents.encode("utf-8", "surrogatepass")),
+        add_line_numbers,
+        tuple(map(tuple, spans)) if spans else None,
     )
-    problem_statement = instance["problem_statement"]
-    final_text = [
-        premise,
-        "<issue>",
-        problem_statement,
-        "</issue>",
-        "<code>",
-        readmes_text,
-        code_text,
-        "</code>",
-        instructions,
-        "<example>",
-        FULL_GENERATION_EXAMPLE,
-        "</example>",
-    ]
-    final_text = "\n".join(final_text)
-    return final_text
-
-
-def ingest_files(filenames):
+    count = _TOKEN_COUNT_CACHE.get(key)
+    if count is not None:
+        _TOKEN_COUNT_CACHE.move_to_end(key)
+        return count
+    block = "".join(iter_code_text({filename: contents}, add_line_numbers, {filename: spans}))
+    count = _TOKEN_COUNT_CACHE[key] = len(tokenizer_func(block, tokenizer))
+    if len(_TOKEN_COUNT_CACHE) > _TOKEN_COUNT_CACHE_SIZE:
+        _TOKEN_COUNT_CACHE.popitem(last=False)
+    return count
+
+
+def text_token_count(text, tokenizer_name, tokenizer, tokenizer_func):
+    """
+    Token count of a prompt part (issue, READMEs), cached by content.
+    """
+    key = (tokenizer_name, git_blob_sha(text.encode("utf-8", "surrogatepass")))
+    count = _TOKEN_COUNT_CACHE.get(key)
+    if count is not None:
+        _TOKEN_COUNT_CACHE.move_to_end(key)
+        return count
+    count = _TOKEN_COUNT_CACHE[key] = len(tokenizer_func(text, tokenizer))
+    if len(_TOKEN_COUNT_CACHE) > _TOKEN_COUNT_CACHE_SIZE:
+        _TOKEN_COUNT_CACHE.popitem(last=False)
+    return count
+
+
+def pack_file_contents(
+    files_dict,
+    budget,
+    add_line_numbers=True,
+    file_spans=None,
+    tokenizer_name=None,
+    tokenizer=None,
+    tokenizer_func=None,
+):
+    """
+    Keeps whole files of files_dict, in its order (retrieval rank for bm25),
+    while their code blocks fit in budget tokens. A file that does not fit
+    is skipped so that smaller, lower-ranked files can still be included.
+    Returns the kept files, in the same order, and the tokens they use.
+    """
+    packed = dict()
+    used = 0
+    for filename, contents in files_dict.items():
+        spans = file_spans.get(filename) if file_spans else None
+        # 블록 사이 줄바꿈과 경계에서 토큰이 달라지는 몫으로 2개를 더함
+        cost = 2 + file_token_count(
+            filename, contents, add_line_numbers, spans, tokenizer_name, tokenizer, tokenizer_func
+        )
+        if used + cost <= budget:
+            packed[filename] = contents
+            used += cost
+    return packed, used
+
+
+def ingest_files(filenames, root_dir=None, reader=None, commit=None):
+    # 키는 저장소 기준 상대 경로 그대로, 읽기는 root_dir 기준
+    # reader가 있으면 commit의 blob SHA로 찾아 프로세스 공용 캐시에서 읽음
+    # 새 파일의 /dev/null처럼 저장소 밖 경로는 예전처럼 디스크에서 읽음
+    tracked = [x for x in filenames if not os.path.isabs(x) and not x.startswith("..")]
+    blob_shas = dict(reader.list_tree(commit, tracked)) if reader is not None and tracked else {}
     files_dict = dict()
     for filename in filenames:
-        with open(filename) as f:
+        if filename in blob_shas:
+            files_dict[filename] = BLOB_CACHE.get(blob_shas[filename], reader)
+            continue
+        with open(filename if root_dir is None else os.path.join(root_dir, filename)) as f:
             content = f.read()
         files_dict[filename] = content
     return files_dict
@@ -345,6 +581,174 @@ def get_oracle_filenames(instance):
     return gold_docs
 
 
+def make_text_inputs(
+    instance,
+    cm,
+    prompt_style,
+    file_source,
+    max_context_len=None,
+    tokenizer=None,
+    tokenizer_func=None,
+    tokenizer_name=None,
+    ingest_workers=INGEST_WORKERS,
+):
+    """Builds the processed instance (readmes, file_contents, text_inputs)
+    from the checkout prepared by the context manager cm. With max_context_len,
+    only whole files that fit in the tokens left by the rest of the prompt are kept."""
+    instance_id = instance["instance_id"]
+    # 최상위 키만 추가하므로 얕은 복사로 충분
+    processed_instance = dict(instance)
+
+    # Add readmes
+    reader = cm.get_tree_reader()
+    readmes = cm.get_readme_files()
+    processed_instance["readmes"] = ingest_files(readmes, cm.repo_path, reader, cm.base_commit)
+
+    # Handle file contents based on configuration
+    if max_context_len is not None:
+        processed_instance["file_contents"] = dict()
+        # 고정된 템플릿 부분은 tokenizer별로 한 번만 토큰화됨
+        base_text_input_length = PROMPT_TEMPLATES[prompt_style].token_count(
+            processed_instance, tokenizer_name, tokenizer, tokenizer_func
+        )
+
+    if file_source == "oracle":
+        processed_instance["file_contents"] = ingest_files(
+            get_oracle_filenames(processed_instance), cm.repo_path, reader, cm.base_commit
+        )
+    elif file_source == "bm25":
+        processed_instance["file_contents"] = ingest_files(
+            [x["docid"] for x in processed_instance["hits"]],
+            cm.repo_path,
+            reader,
+            cm.base_commit,
+        )
+        # 청크 단위 검색 결과면 해당 줄 범위만 프롬프트에 넣음
+        file_spans = {
+            x["docid"]: x["spans"] for x in processed_instance["hits"] if x.get("spans")
+        }
+        if file_spans:
+            processed_instance["file_spans"] = file_spans
+    elif file_source == "all":
+        processed_instance["file_contents"] = ingest_directory_contents(
+            cm.repo_path, num_workers=ingest_workers
+        )
+
+    if max_context_len is not None:
+        # 고정된 프롬프트 부분을 뺀 예산 안에서 파일을 통째로 채움
+        add_line_numbers, use_spans = PROMPT_CODE_OPTIONS[prompt_style]
+        file_contents = processed_instance["file_contents"]
+        if file_source != "bm25":
+            # 순위가 없으므로 파일 이름 순으로 채움
+            file_contents = dict(sorted(file_contents.items()))
+        budget = max_context_len - base_text_input_length
+        packed, used = pack_file_contents(
+            file_contents,
+            budget,
+            add_line_numbers,
+            processed_instance.get("file_spans") if use_spans else None,
+            tokenizer_name,
+            tokenizer,
+            tokenizer_func,
+        )
+        if len(packed) < len(file_contents):
+            logger.info(
+                f"Packed {len(packed)} of {len(file_contents)} files ({used} tokens) into {max(budget, 0)} tokens for {instance_id}"
+            )
+        processed_instance["file_contents"] = packed
+
+    # Generate text inputs
+    text_inputs = PROMPT_FUNCTIONS[prompt_style](processed_instance)
+
+    # 텍스트 길이 제한 제거 (전체 내용 포함)
+    # max_text_length = 40000  # 제한 제거
+    # if len(text_inputs) > max_text_length:
+    #     logger.warning(f"Truncating text_inputs for {instance_id} from {len(text_inputs)} to {max_text_length} characters")
+    #     text_inputs = text_inputs[:max_text_length]
+
+    # 텍스트 생성 로그 출력
+    logger.info(f"Generated text_inputs for {instance_id}:")
+    logger.info(f"  - Length: {len(text_inputs):,} characters")
+    logger.info(f"  - Preview (first 500 chars):")
+    logger.info(f"    {text_inputs[:500]}...")
+    logger.info(f"  - Files included: {list(processed_instance.get('file_contents', {}).keys())}")
+    logger.info(f"  - README files: {list(processed_instance.get('readmes', {}).keys())}")
+
+    processed_instance["text_inputs"] = text_inputs
+
+    # 파일 없이도 max_context_len을 넘는 경우(긴 이슈, README)에만 토큰 단위로 자름
+    if max_context_len is not None and base_text_input_length > max_context_len:
+        text_inputs_tokens = tokenizer_func(
+            processed_instance["text_inputs"], tokenizer
+        )
+        if len(text_inputs_tokens) > max_context_len:
+            logger.warning(
+                f"Truncating {instance_id} from {len(text_inputs_tokens)} to {max_context_len} tokens"
+            )
+            processed_instance["text_inputs"] = tokenizer.decode(
+                text_inputs_tokens[:max_context_len]
+            )
+
+    return processed_instance
+
+
+# 작업 프로세스별 상태 (worktree, tokenizer)
+_worker_state = {}
+
+
+def init_worker(
+    root_dir, prompt_style, file_source, max_context_len, tokenizer_name, verbose, ingest_workers
+):
+    _worker_state.update(
+        root_dir=root_dir,
+        prompt_style=prompt_style,
+        file_source=file_source,
+        max_context_len=max_context_len,
+        verbose=verbose,
+        ingest_workers=ingest_workers,
+        tokenizer=None,
+        tokenizer_func=None,
+        tokenizer_name=tokenizer_name,
+        # worktree 이름에 pid가 들어가므로 프로세스끼리 겹치지 않음
+        worktree_pool=WorktreePool(os.path.join(root_dir, "worktrees"), size=1, verbose=verbose),
+    )
+    if max_context_len is not None:
+        _worker_state["tokenizer"], _worker_state["tokenizer_func"] = TOKENIZER_FUNCS[
+            tokenizer_name
+        ]
+
+
+def process_instance(instance):
+    """Returns (instance_id, progress file line, error, (cache hits, misses))
+    for one instance; either the line or the (message, traceback) error is None."""
+    state = _worker_state
+    hits, misses = BLOB_CACHE.hits, BLOB_CACHE.misses
+    try:
+        with AutoContextManager(
+            instance,
+            state["root_dir"],
+            verbose=state["verbose"],
+            worktree_pool=state["worktree_pool"],
+        ) as cm:
+            processed_instance = make_text_inputs(
+                instance,
+                cm,
+                state["prompt_style"],
+                state["file_source"],
+                state["max_context_len"],
+                state["tokenizer"],
+                state["tokenizer_func"],
+                state["tokenizer_name"],
+                state["ingest_workers"],
+            )
+        line, error = json.dumps(processed_instance), None
+    except Exception as e:
+        line, error = None, (str(e), traceback.format_exc())
+    # 작업 프로세스의 캐시 통계는 결과와 함께 부모에게 전달
+    cache_counts = (BLOB_CACHE.hits - hits, BLOB_CACHE.misses - misses)
+    return instance["instance_id"], line, error, cache_counts
+
+
 def add_text_inputs(
     instances,
     retrieval_file,
@@ -355,6 +759,8 @@ def add_text_inputs(
     tokenizer_name=None,
     verbose=False,
     progress_file=None,
+    num_workers=1,
+    ingest_workers=None,
 ) -> None:
     """Process instances and save results to progress file.
 
@@ -366,26 +772,24 @@ def add_text_inputs(
     - file_source: where to collect file_contents (e.g. oracle or bm25)
     - verbose: set ContextManager verbose to True
     - progress_file: required, path to save processed instances
+    - num_workers: number of worker processes, each with its own worktree and tokenizer
+    - ingest_workers: threads per worker reading repository files for file_source "all"
+      (default: INGEST_WORKERS split across the worker processes)
     """
     assert progress_file is not None, "progress_file is required"
+    if ingest_workers is None:
+        ingest_workers = max(1, INGEST_WORKERS // num_workers)
 
     # Create progress file directory if it doesn't exist
     progress_path = Path(progress_file)
     progress_path.parent.mkdir(parents=True, exist_ok=True)
 
-    # Load already processed instances
-    processed_ids = set()
+    # Load already processed instances (인덱스만 읽고, 끊긴 마지막 줄은 복구)
     file_exists = os.path.exists(progress_file)
-
+    progress = ProgressFile(progress_file)
+    processed_ids = progress.instance_ids
     if file_exists:
-        with open(progress_file) as f:
-            for line in f:
-                instance = json.loads(line)
-                processed_ids.add(instance["instance_id"])
         logger.info(f"Found {len(processed_ids)} already processed instances")
-        progress_file_handle = open(progress_file, "a")
-    else:
-        progress_file_handle = open(progress_file, "w")
 
     try:
         if max_context_len is not None:
@@ -405,90 +809,57 @@ def add_text_inputs(
         }
         logger.info(f"Processing {len(instances_to_process)} instances")
 
-        orig_dir = os.getcwd()
         with TemporaryDirectory(
             dir="/scratch" if os.path.exists("/scratch") else "/tmp"
         ) as root_dir:
-            for instance_id, instance in tqdm(
-                instances_to_process.items(),
-                total=len(instances_to_process),
-                desc="Processing instances",
-            ):
-                try:
-                    with AutoContextManager(instance, root_dir, verbose=verbose) as cm:
-                        # Process instance
-                        processed_instance = deepcopy(instance)
-
-                        # Add readmes
-                        readmes = cm.get_readme_files()
-                        processed_instance["readmes"] = ingest_files(readmes)
-
-                        # Handle file contents based on configuration
-                        if max_context_len is not None:
-                            processed_instance["file_contents"] = dict()
-                            base_text_inputs = PROMPT_FUNCTIONS[prompt_style](
-                                processed_instance
-                            )
-                            base_text_input_length = len(
-                                tokenizer_func(base_text_inputs, tokenizer)
-                            )
-
-                        if file_source == "oracle":
-                            processed_instance["file_contents"] = ingest_files(
-                                get_oracle_filenames(processed_instance)
-                            )
-                        elif file_source == "bm25":
-                            processed_instance["file_contents"] = ingest_files(
-                                [x["docid"] for x in processed_instance["hits"]]
-                            )
-                        elif file_source == "all":
-                            processed_instance["file_contents"] = (
-                                ingest_directory_contents(cm.repo_path)
-                            )
-
-                        # Generate text inputs
-                        text_inputs = PROMPT_FUNCTIONS[prompt_style](processed_instance)
-                        
-                        # 텍스트 길이 제한 제거 (전체 내용 포함)
-                        # max_text_length = 40000  # 제한 제거
-                        # if len(text_inputs) > max_text_length:
-                        #     logger.warning(f"Truncating text_inputs for {instance_id} from {len(text_inputs)} to {max_text_length} characters")
-                        #     text_inputs = text_inputs[:max_text_length]
-                        
-                        # 텍스트 생성 로그 출력
-                        logger.info(f"Generated text_inputs for {instance_id}:")
-                        logger.info(f"  - Length: {len(text_inputs):,} characters")
-                        logger.info(f"  - Preview (first 500 chars):")
-                        logger.info(f"    {text_inputs[:500]}...")
-                        logger.info(f"  - Files included: {list(processed_instance.get('file_contents', {}).keys())}")
-                        logger.info(f"  - README files: {list(processed_instance.get('readmes', {}).keys())}")
-                        
-                        processed_instance["text_inputs"] = text_inputs
-
-                        # Apply max_context_len if specified
-                        if max_context_len is not None:
-                            text_inputs_tokens = tokenizer_func(
-                                processed_instance["text_inputs"], tokenizer
-                            )
-                            if len(text_inputs_tokens) > max_context_len:
-                                logger.warning(
-                                    f"Truncating {instance_id} from {len(text_inputs_tokens)} to {max_context_len} tokens"
-                                )
-                                processed_instance["text_inputs"] = tokenizer.decode(
-                                    text_inputs_tokens[:max_context_len]
-                                )
-
-                        # Save to progress file
-                        print(json.dumps(processed_instance), file=progress_file_handle, flush=True)
-                        
-                        # 메모리 정리
-                        del processed_instance
-                        import gc
-                        gc.collect()
-                        
-                except Exception as e:
-                    logger.error(f"Failed on instance {instance_id}: {e}")
-                    logger.error(traceback.format_exc())
-                    continue
+            worker_args = (
+                root_dir,
+                prompt_style,
+                file_source,
+                max_context_len,
+                tokenizer_name,
+                verbose,
+                ingest_workers,
+            )
+            if num_workers > 1:
+                # 작업 프로세스들이 같은 클론을 동시에 만들지 않도록 저장소별로 미리 클론
+                for instance in {
+                    x["repo"]: x for x in instances_to_process.values()
+                }.values():
+                    AutoContextManager(instance, root_dir, verbose=verbose)
+                pool = Pool(num_workers, initializer=init_worker, initargs=worker_args)
+                # imap은 입력 순서대로 결과를 돌려주므로 진행 파일 순서가 직렬 실행과 같음
+                results = pool.imap(process_instance, instances_to_process.values())
+            else:
+                pool = None
+                init_worker(*worker_args)
+                results = map(process_instance, instances_to_process.values())
+            cache_hits = cache_misses = 0
+            try:
+                # 진행 파일은 이 프로세스만 씀
+                for instance_id, line, error, cache_counts in tqdm(
+                    results,
+                    total=len(instances_to_process),
+                    desc="Processing instances",
+                ):
+                    cache_hits += cache_counts[0]
+                    cache_misses += cache_counts[1]
+                    if error is not None:
+                        logger.error(f"Failed on instance {instance_id}: {error[0]}")
+                        logger.error(error[1])
+                        continue
+                    progress.append(instance_id, line)
+            finally:
+                if pool is not None:
+                    pool.terminate()
+                    pool.join()
+                else:
+                    close_tree_readers()
+                    _worker_state["worktree_pool"].close()
+            total = cache_hits + cache_misses
+            logger.info(
+                f"File cache: {cache_hits} hits, {cache_misses} misses "
+                f"({cache_hits / total if total else 0.0:.1%} hit rate)"
+            )
     finally:
-        progress_file_handle.close()
+        progress.close()
@@ -16,6 +16,7 @@ from swebench.inference.make_datasets.create_instance import (
     add_text_inputs,
     PROMPT_FUNCTIONS,
 )
+from swebench.inference.make_datasets.progress_index import ProgressFile
 from swebench.inference.make_datasets.tokenize_dataset import TOKENIZER_FUNCS
 
 logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
@@ -123,6 +124,8 @@ def main(
     max_context_len,
     tokenizer_name,
     push_to_hub_user,
+    num_workers=1,
+    ingest_workers=None,
 ):
     # Validate arguments and setup
     hub_token = validate_arguments(
@@ -195,6 +198,8 @@ def main(
             max_context_len=max_context_len,
             tokenizer_name=tokenizer_name,
             progress_file=progress_file,
+            num_workers=num_workers,
+            ingest_workers=ingest_workers,
         )
 
     logger.info("Creating final dataset")
@@ -206,16 +211,16 @@ def main(
     for split in splits:
         split_data = {key: [] for key in columns}
         valid_instance_ids = set(dataset[split]["instance_id"])
-        invalid_instances = []
 
-        with open(progress_files[split]) as f:
-            for line in f:
+        # 인덱스로 유효한 인스턴스의 줄만 찾아 읽음 (나머지는 디코딩하지 않음)
+        with ProgressFile(progress_files[split]) as progress:
+            invalid_instances = [
+                entry[0] for entry in progress.entries if entry[0] not in valid_instance_ids
+            ]
+            for _, line in progress.iter_lines(valid_instance_ids):
                 datum = extract_fields(json.loads(line))
                 if not datum:
                     continue
-                if datum["instance_id"] not in valid_instance_ids:
-                    invalid_instances.append(datum["instance_id"])
-                    continue
                 for key in columns:
                     split_data[key].append(datum.get(key, ""))
 
@@ -248,8 +253,9 @@ def main(
 
     # Cleanup progress files
     for progress_file in progress_files.values():
-        if os.path.exists(progress_file):
-            os.remove(progress_file)
+        for path in [progress_file, f"{progress_file}.index"]:
+            if os.path.exists(path):
+                os.remove(path)
 
     logger.info(f"Finished saving to {output_file}")
 
@@ -318,4 +324,17 @@ if __name__ == "__main__":
         type=str,
         help="Username to use for pushing to the Hub. If not provided, will save to disk.",
     )
+    parser.add_argument(
+        "--num_workers",
+        type=int,
+        default=1,
+        help="Number of processes building prompts in parallel, each with its own worktree.",
+    )
+    parser.add_argument(
+        "--ingest_workers",
+        type=int,
+        default=None,
+        help="Threads per process reading repository files for --file_source all "
+        "(default: 8 split across --num_workers).",
+    )
     main(**vars(parser.parse_args()))
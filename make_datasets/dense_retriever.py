@@ -0,0 +1,366 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+로컬 임베딩 모델(CPU)로 파일 청크를 임베딩해 BM25와 함께 쓰는 하이브리드 검색.
+임베딩은 git blob SHA별로 float16 파일에 누적 저장되므로 스냅샷이 바뀌어도 변경된 파일만 다시 임베딩하고,
+BM25 결과와 dense 결과는 reciprocal rank fusion으로 합칩니다.
+"""
+
+import fcntl
+import hashlib
+import json
+import os
+from collections import defaultdict
+from contextlib import contextmanager
+
+import numpy as np
+
+from bm25 import BM25Retriever, git_blob_sha
+
+
+def chunk_text(content, chunk_lines=40):
+    """
+    Splits a file into windows of chunk_lines lines. Blank files give no chunks.
+    """
+    lines = content.splitlines()
+    chunks = [
+        "\n".join(lines[start : start + chunk_lines])
+        for start in range(0, len(lines), chunk_lines)
+    ]
+    return [chunk for chunk in chunks if chunk.strip()]
+
+
+WEIGHT_SUFFIXES = (".safetensors", ".bin", ".pt", ".pth", ".ckpt")
+
+
+def checkpoint_hash(model_path, chunk_size=1 << 20):
+    """
+    Short hash identifying a checkpoint: config.json and the weight files
+    (names and contents) of a model directory, so checkpoints in folders of
+    the same name never share embeddings. A hub model id (no local directory)
+    already names one checkpoint and is hashed as is.
+    """
+    digest = hashlib.sha1()
+    if not os.path.isdir(model_path):
+        digest.update(model_path.encode("utf-8"))
+        return digest.hexdigest()[:12]
+    for filename in sorted(os.listdir(model_path)):
+        if filename != "config.json" and not filename.endswith(WEIGHT_SUFFIXES):
+            continue
+        digest.update(filename.encode("utf-8") + b"\0")
+        # 모델 하나당 실행마다 한 번 전체를 읽음
+        with open(os.path.join(model_path, filename), "rb") as f:
+            for block in iter(lambda: f.read(chunk_size), b""):
+                digest.update(block)
+    return digest.hexdigest()[:12]
+
+
+class Embedder:
+    """
+    Mean-pooled, L2-normalized sentence embeddings from a local Hugging Face
+    encoder (e.g. a downloaded all-MiniLM-L6-v2 or bge-small), run on CPU.
+    """
+
+    def __init__(self, model_path, max_length=256, batch_size=32):
+        # torch / transformers는 dense 검색을 쓸 때만 필요
+        import torch
+        from transformers import AutoModel, AutoTokenizer
+
+        self.torch = torch
+        self.tokenizer = AutoTokenizer.from_pretrained(model_path, local_files_only=True)
+        self.model = AutoModel.from_pretrained(model_path, local_files_only=True).eval()
+        self.max_length = max_length
+        self.batch_size = batch_size
+        self.dim = self.model.config.hidden_size
+        self.signature = (
+            f"{os.path.basename(os.path.normpath(model_path))}-{max_length}-{checkpoint_hash(model_path)}"
+        )
+
+    def encode(self, texts):
+        """
+        Returns a (len(texts), dim) float32 array of unit vectors.
+        """
+        vectors = []
+        for start in range(0, len(texts), self.batch_size):
+            batch = self.tokenizer(
+                texts[start : start + self.batch_size],
+                padding=True,
+                truncation=True,
+                max_length=self.max_length,
+                return_tensors="pt",
+            )
+            with self.torch.inference_mode():
+                hidden = self.model(**batch).last_hidden_state
+            mask = batch["attention_mask"].unsqueeze(-1).to(hidden.dtype)
+            pooled = (hidden * mask).sum(dim=1) / mask.sum(dim=1).clamp(min=1e-9)
+            pooled = self.torch.nn.functional.normalize(pooled, dim=-1)
+            vectors.append(pooled.numpy().astype(np.float32))
+        if not vectors:
+            return np.empty((0, self.dim), dtype=np.float32)
+        return np.concatenate(vectors)
+
+
+class EmbeddingStore:
+    """
+    Chunk embeddings keyed by git blob SHA in index_dir:
+    vectors.f16 (float16 rows, append-only), blobs.tsv (sha, first row, row
+    count) and meta.json (embedder signature, dim, chunking). A blob is only
+    embedded the first time it is seen, in any snapshot. Appends take a file
+    lock, so worker processes can share one store.
+    """
+
+    def __init__(self, index_dir, embedder, chunk_lines=40, batch_chunks=256):
+        self.index_dir = index_dir
+        self.embedder = embedder
+        self.chunk_lines = chunk_lines
+        self.batch_chunks = batch_chunks
+        os.makedirs(index_dir, exist_ok=True)
+
+        meta = {'embedder': embedder.signature, 'dim': embedder.dim, 'chunk_lines': chunk_lines}
+        meta_file = os.path.join(index_dir, "meta.json")
+        if os.path.exists(meta_file):
+            with open(meta_file, 'r') as f:
+                stored = json.load(f)
+            if stored != meta:
+                raise ValueError(f"Embedding index {index_dir} was built with {stored}, not {meta}")
+        else:
+            with open(meta_file, 'w') as f:
+                json.dump(meta, f)
+
+        self.vectors_file = os.path.join(index_dir, "vectors.f16")
+        self.blobs_file = os.path.join(index_dir, "blobs.tsv")
+        self.lock_file = os.path.join(index_dir, "lock")
+        self.row_bytes = embedder.dim * 2
+        self.blobs = {}  # blob sha -> (first row, number of rows)
+        with self.locked():
+            if os.path.exists(self.blobs_file):
+                with open(self.blobs_file, 'r') as f:
+                    for line in f:
+                        parts = line.split()
+                        if len(parts) == 3 and line.endswith("\n"):
+                            self.blobs[parts[0]] = (int(parts[1]), int(parts[2]))
+            # 인덱스 줄 없이 남은 벡터(중단된 실행의 잔여분)는 잘라냄
+            self.num_rows = max((start + count for start, count in self.blobs.values()), default=0)
+            with open(self.vectors_file, 'ab') as f:
+                f.truncate(self.num_rows * self.row_bytes)
+        self.pending = []  # (sha, chunks) waiting to be embedded
+        self.pending_shas = set()
+        self.pending_chunks = 0
+        self._matrix = None
+
+    @contextmanager
+    def locked(self):
+        with open(self.lock_file, 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def add(self, content):
+        """
+        Queues content for embedding unless its blob is already stored.
+        Returns the blob sha.
+        """
+        sha = git_blob_sha(content)
+        if sha in self.blobs or sha in self.pending_shas:
+            return sha
+        chunks = chunk_text(content, self.chunk_lines)
+        self.pending.append((sha, chunks))
+        self.pending_shas.add(sha)
+        self.pending_chunks += len(chunks)
+        if self.pending_chunks >= self.batch_chunks:
+            self.flush()
+        return sha
+
+    def flush(self):
+        """
+        Embeds the queued blobs and appends them to the store.
+        """
+        if not self.pending:
+            return
+        texts = [chunk for _, chunks in self.pending for chunk in chunks]
+        vectors = self.embedder.encode(texts).astype(np.float16)
+        # 벡터를 먼저 쓰고 인덱스 줄을 나중에 써서 중단되어도 blobs.tsv가 가리키는 행은 항상 완전함
+        with self.locked():
+            with open(self.vectors_file, 'ab') as f:
+                # 다른 워커가 추가한 행 뒤에 이어서 기록
+                row = f.seek(0, os.SEEK_END) // self.row_bytes
+                f.write(vectors.tobytes())
+            with open(self.blobs_file, 'a') as f:
+                for sha, chunks in self.pending:
+                    self.blobs[sha] = (row, len(chunks))
+                    f.write(f"{sha}\t{row}\t{len(chunks)}\n")
+                    row += len(chunks)
+            self.num_rows = row
+        self.pending = []
+        self.pending_shas = set()
+        self.pending_chunks = 0
+        self._matrix = None
+
+    def matrix(self):
+        """
+        Read-only (rows x dim) float16 memmap of every stored chunk.
+        """
+        if self._matrix is None:
+            self._matrix = np.memmap(
+                self.vectors_file, dtype=np.float16, mode='r', shape=(self.num_rows, self.embedder.dim)
+            ) if self.num_rows else np.empty((0, self.embedder.dim), dtype=np.float16)
+        return self._matrix
+
+    def gather(self, shas):
+        """
+        Returns (chunk matrix, chunk offsets) for a list of blobs: the rows of
+        blob i are matrix[offsets[i]:offsets[i + 1]].
+        """
+        self.flush()
+        stored = self.matrix()
+        counts = np.array([self.blobs[sha][1] for sha in shas], dtype=np.int64)
+        offsets = np.concatenate([[0], np.cumsum(counts)])
+        rows = np.concatenate(
+            [np.arange(start, start + count) for start, count in (self.blobs[sha] for sha in shas)]
+        ) if len(shas) else np.empty(0, dtype=np.int64)
+        return np.asarray(stored[rows]), offsets
+
+
+class IVFIndex:
+    """
+    Inverted-file approximate search: chunks are clustered with k-means and
+    a query is scored exactly against the members of its nprobe closest
+    clusters only.
+    """
+
+    def __init__(self, matrix, nlist=None, iterations=10, seed=0):
+        n = len(matrix)
+        self.nlist = max(1, min(n, nlist or int(np.sqrt(n))))
+        rng = np.random.default_rng(seed)
+        sample = matrix[rng.choice(n, size=min(n, self.nlist * 256), replace=False)].astype(np.float32)
+        centroids = sample[rng.choice(len(sample), size=self.nlist, replace=False)]
+        for _ in range(iterations):
+            assignment = np.argmax(sample @ centroids.T, axis=1)
+            for cluster in range(self.nlist):
+                members = sample[assignment == cluster]
+                if len(members):
+                    centroid = members.mean(axis=0)
+                    centroids[cluster] = centroid / max(np.linalg.norm(centroid), 1e-9)
+        self.centroids = centroids
+        assignment = self._assign(matrix)
+        order = np.argsort(assignment, kind='stable')
+        self.members = np.split(order, np.cumsum(np.bincount(assignment, minlength=self.nlist))[:-1])
+
+    def _assign(self, matrix, block=65536):
+        return np.concatenate([
+            np.argmax(matrix[start : start + block].astype(np.float32) @ self.centroids.T, axis=1)
+            for start in range(0, len(matrix), block)
+        ]) if len(matrix) else np.empty(0, dtype=np.int64)
+
+    def candidates(self, query_vector, nprobe):
+        probes = np.argsort(-(self.centroids @ query_vector))[:nprobe]
+        return np.concatenate([self.members[cluster] for cluster in probes])
+
+
+def reciprocal_rank_fusion(rankings, k=60, top_k=20):
+    """
+    Fuses ranked docid lists with RRF: score = sum of 1 / (k + rank).
+    Ties keep the order in which documents first appear in rankings.
+    """
+    scores = defaultdict(float)
+    for ranking in rankings:
+        for rank, docid in enumerate(ranking, start=1):
+            scores[docid] += 1 / (k + rank)
+    fused = sorted(scores.items(), key=lambda x: -x[1])[:top_k]
+    return [{'docid': docid, 'score': score} for docid, score in fused]
+
+
+class HybridRetriever(BM25Retriever):
+    """
+    BM25Retriever that also ranks files by their best-matching chunk
+    embedding and fuses both top-pool_size lists with reciprocal rank fusion.
+    Results use the same {'docid', 'score'} hits as BM25Retriever.
+    """
+
+    def __init__(
+        self,
+        k1=1.5,
+        b=0.75,
+        tokenizer=None,
+        store=None,
+        pool_size=100,
+        rrf_k=60,
+        ann="exact",
+        nprobe=8,
+    ):
+        super().__init__(k1=k1, b=b, tokenizer=tokenizer)
+        assert store is not None, "HybridRetriever needs an EmbeddingStore"
+        assert ann in ("exact", "ivf"), f"Unknown ANN method {ann}"
+        self.store = store
+        self.pool_size = pool_size
+        self.rrf_k = rrf_k
+        self.ann = ann
+        self.nprobe = nprobe
+        self.chunks = None
+        self.chunk_offsets = None
+        self.ivf = None
+
+    def fit(self, documents):
+        """
+        documents: iterable of dicts with 'docid' and 'content' keys. Each file
+        is fed to BM25 and to the embedding store in the same pass.
+        """
+        shas = []
+
+        def staged():
+            for doc in documents:
+                shas.append(self.store.add(doc['content']))
+                yield doc
+
+        super().fit(staged())
+        self.chunks, self.chunk_offsets = self.store.gather(shas)
+        self.ivf = IVFIndex(self.chunks) if self.ann == "ivf" and len(self.chunks) else None
+
+    @classmethod
+    def load(cls, path, **kwargs):
+        raise ValueError("HybridRetriever needs file contents, use fit() instead of --index_dir")
+
+    def dense_rankings(self, queries, top_k):
+        """
+        Ranks files by their highest chunk similarity for each query.
+        """
+        if self.chunks is None or not len(self.chunks):
+            return [[] for _ in queries]
+        query_vectors = self.store.embedder.encode(queries)
+        has_chunks = np.diff(self.chunk_offsets) > 0
+        starts = self.chunk_offsets[:-1][has_chunks]
+        doc_ids = np.flatnonzero(has_chunks)
+
+        rankings = []
+        for query_vector in query_vectors:
+            if self.ivf is None:
+                chunk_scores = self.chunks.astype(np.float32) @ query_vector
+            else:
+                candidates = self.ivf.candidates(query_vector, self.nprobe)
+                chunk_scores = np.full(len(self.chunks), -np.inf, dtype=np.float32)
+                chunk_scores[candidates] = self.chunks[candidates].astype(np.float32) @ query_vector
+            # 파일 점수 = 가장 비슷한 청크의 점수
+            doc_scores = np.maximum.reduceat(chunk_scores, starts)
+            order = np.lexsort((doc_ids, -doc_scores))[:top_k]
+            rankings.append([
+                self.documents[doc_ids[i]]['docid'] for i in order if np.isfinite(doc_scores[i])
+            ])
+        return rankings
+
+    def search_batch(self, queries, top_k=20, prune=False):
+        bm25_hits = [
+            BM25Retriever.search(self, query, top_k=self.pool_size, prune=prune) for query in queries
+        ]
+        dense = self.dense_rankings(queries, self.pool_size)
+        return [
+            reciprocal_rank_fusion(
+                [[hit['docid'] for hit in hits], ranking], k=self.rrf_k, top_k=top_k
+            )
+            for hits, ranking in zip(bm25_hits, dense)
+        ]
+
+    def search(self, query, top_k=20, prune=False):
+        return self.search_batch([query], top_k=top_k, prune=prune)[0]
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+SQLite 기반 디스크 LRU 캐시 (key -> bytes). 크기 상한을 넘으면 가장 오래 쓰지 않은 항목부터 지웁니다.
+"""
+
+import os
+import sqlite3
+import time
+
+
+class DiskLRUCache:
+    """
+    Size-bounded key -> bytes store in a single SQLite file with LRU eviction
+    and hit/miss counters. Safe to share between processes.
+    """
+
+    def __init__(self, path, max_bytes=1 << 30):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        parent = os.path.dirname(os.path.abspath(path))
+        os.makedirs(parent, exist_ok=True)
+        self.conn = sqlite3.connect(path, timeout=60, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            "key TEXT PRIMARY KEY, value BLOB NOT NULL, "
+            "size INTEGER NOT NULL, last_used INTEGER NOT NULL)"
+        )
+        self.conn.execute(
+            "CREATE INDEX IF NOT EXISTS entries_last_used ON entries (last_used)"
+        )
+        self._total_bytes = self._stored_bytes()
+
+    def _stored_bytes(self):
+        return self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+
+    def get(self, key):
+        row = self.conn.execute("SELECT value FROM entries WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.conn.execute(
+            "UPDATE entries SET last_used = ? WHERE key = ?", (time.time_ns(), key)
+        )
+        return row[0]
+
+    def put(self, key, value):
+        self.conn.execute(
+            "INSERT OR REPLACE INTO entries (key, value, size, last_used) VALUES (?, ?, ?, ?)",
+            (key, value, len(value), time.time_ns()),
+        )
+        self._total_bytes += len(value)
+        if self._total_bytes > self.max_bytes:
+            self.evict()
+
+    def evict(self):
+        """
+        Deletes least recently used entries until the cache fits in max_bytes.
+        """
+        # 다른 프로세스도 쓰고 있을 수 있으므로 실제 크기를 다시 계산
+        self._total_bytes = self._stored_bytes()
+        while self._total_bytes > self.max_bytes:
+            rows = self.conn.execute(
+                "SELECT key, size FROM entries ORDER BY last_used LIMIT 64"
+            ).fetchall()
+            if not rows:
+                break
+            self.conn.executemany("DELETE FROM entries WHERE key = ?", [(key,) for key, _ in rows])
+            self._total_bytes -= sum(size for _, size in rows)
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0,
+        }
+
+    def close(self):
+        self.conn.close()
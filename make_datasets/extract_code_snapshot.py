@@ -2,8 +2,7 @@ import os
 import json
 import sys
 sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
-from utils import ingest_directory_contents  # 절대 임포트로 수정
-import subprocess
+from utils import GitTreeReader  # 절대 임포트로 수정
 
 # 설정
 REPO_PATH = "/mnt/c/Users/USER/Documents/MONAI"
@@ -15,23 +14,22 @@ with open("filtered_prs.json", "r", encoding="utf-8") as f:
     prs = json.load(f)
 
 # 각 PR마다 base commit 기준으로 전체 코드 수집
-for pr in prs:
-    pr_number = pr["number"]
-    base_sha = pr["base_sha"]
-    snapshot_file = os.path.join(OUTPUT_DIR, f"pr_{pr_number}_code.json")
+# checkout 없이 객체 저장소에서 바로 읽으므로 작업 트리는 바뀌지 않음
+with GitTreeReader(REPO_PATH) as reader:
+    for pr in prs:
+        pr_number = pr["number"]
+        base_sha = pr["base_sha"]
+        snapshot_file = os.path.join(OUTPUT_DIR, f"pr_{pr_number}_code.json")
 
-    try:
-        # base commit으로 이동
-        subprocess.run(["git", "checkout", base_sha], cwd=REPO_PATH, check=True)
+        try:
+            # 전체 코드 수집 (테스트 코드는 제외)
+            code_corpus = reader.ingest_directory_contents(base_sha, include_tests=False)
 
-        # 전체 코드 수집 (테스트 코드는 제외)
-        code_corpus = ingest_directory_contents(REPO_PATH, include_tests=False)
+            # 저장
+            with open(snapshot_file, "w", encoding="utf-8") as f:
+                json.dump(code_corpus, f, indent=2, ensure_ascii=False)
 
-        # 저장
-        with open(snapshot_file, "w", encoding="utf-8") as f:
-            json.dump(code_corpus, f, indent=2, ensure_ascii=False)
+            print(f"PR #{pr_number} 코드 스냅샷 저장 완료")
 
-        print(f"PR #{pr_number} 코드 스냅샷 저장 완료")
-
-    except Exception as e:
-        print(f"PR #{pr_number} 코드 수집 실패: {e}")
+        except Exception as e:
+            print(f"PR #{pr_number} 코드 수집 실패: {e}")
@@ -13,14 +13,8 @@ os.makedirs(PATCH_OUTPUT_DIR, exist_ok=True)
 with open("filtered_prs.json", "r", encoding="utf-8") as f:
     prs = json.load(f)
 
-# 변경사항 임시 보관
-try:
-    subprocess.run(["git", "stash", "-u"], cwd=REPO_PATH, check=True)
-    print("변경사항 stash 처리 완료")
-except subprocess.CalledProcessError as e:
-    print(f"stash 실패: {e}")
-
 # 각 PR에 대해 patch 생성
+# 커밋 간 diff만 필요하므로 checkout / stash 없이 작업 트리를 그대로 둠
 for pr in prs:
     pr_number = pr["number"]
     base_sha = pr["base_sha"]
@@ -28,9 +22,6 @@ for pr in prs:
     patch_file = os.path.join(PATCH_OUTPUT_DIR, f"pr_{pr_number}.patch")
 
     try:
-        # base로 체크아웃
-        subprocess.run(["git", "checkout", base_sha], cwd=REPO_PATH, check=True)
-
         # patch 추출
         with open(patch_file, "w", encoding="utf-8") as f:
             subprocess.run(
@@ -42,11 +33,4 @@ for pr in prs:
 
     except subprocess.CalledProcessError as e:
         print(f"PR #{pr_number} 처리 실패: {e}")
-        continue
-
-# 마지막에 main 브랜치로 되돌리기
-try:
-    subprocess.run(["git", "checkout", "main"], cwd=REPO_PATH, check=True)
-    print("🔄 main 브랜치로 복귀 완료")
-except subprocess.CalledProcessError:
-    print("⚠️ main 브랜치 복귀 실패 (직접 확인 필요)")
\ No newline at end of file
+        continue
\ No newline at end of file
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+진행 JSONL 파일과 사이드카 인덱스(instance_id, 바이트 오프셋, 길이, CRC32). 재개할 때 프롬프트가
+들어 있는 줄을 다시 파싱하지 않고 인덱스만 읽으며, 최종 데이터셋을 만들 때는 필요한 줄로 바로 이동해 읽습니다.
+"""
+
+import json
+import logging
+import os
+import zlib
+
+logger = logging.getLogger(__name__)
+
+
+class ProgressFile:
+    """
+    Append-only progress JSONL with a "<path>.index" sidecar holding one
+    "instance_id<TAB>offset<TAB>length<TAB>crc32" line per record. Records
+    are written before their index line, so on open the index can only lag
+    the data: unindexed complete lines at the end are indexed, a torn last
+    line (from a crash mid-write) is cut off, and index entries pointing
+    past the data or failing their checksum are dropped. A progress file
+    without an index is indexed once on open.
+    """
+
+    def __init__(self, path):
+        self.path = str(path)
+        self.index_path = self.path + ".index"
+        self.entries = []  # [(instance_id, offset, length, crc32)] 파일 순서
+        self.instance_ids = set()
+        self.recover()
+        self.handle = open(self.path, "ab")
+        self.index_handle = open(self.index_path, "a")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self):
+        self.handle.close()
+        self.index_handle.close()
+
+    def _read_index(self):
+        entries = []
+        if not os.path.exists(self.index_path):
+            return entries
+        with open(self.index_path) as f:
+            for line in f:
+                fields = line.rstrip("\n").split("\t")
+                # 쓰다가 끊긴 마지막 인덱스 줄은 무시
+                if not line.endswith("\n") or len(fields) != 4:
+                    break
+                try:
+                    entries.append((fields[0], int(fields[1]), int(fields[2]), int(fields[3])))
+                except ValueError:
+                    break
+        return entries
+
+    def recover(self):
+        """
+        Brings the index in line with the progress file, see the class docstring.
+        """
+        entries = self._read_index()
+        indexed = len(entries)
+        if not os.path.exists(self.path):
+            open(self.path, "wb").close()
+        size = os.path.getsize(self.path)
+        with open(self.path, "r+b") as f:
+            # 데이터보다 앞선 인덱스 항목은 버림 (내용은 마지막 항목만 확인)
+            while entries:
+                _, offset, length, crc = entries[-1]
+                if offset + length <= size:
+                    f.seek(offset)
+                    if zlib.crc32(f.read(length)) == crc:
+                        break
+                entries.pop()
+            end = entries[-1][1] + entries[-1][2] if entries else 0
+            changed = len(entries) != indexed
+
+            # 인덱스에 없는 꼬리 줄을 색인
+            f.seek(end)
+            while True:
+                record = f.readline()
+                if not record:
+                    break
+                if not record.endswith(b"\n"):
+                    logger.warning(f"Dropping torn last line of {self.path} at byte {end}")
+                    f.truncate(end)
+                    changed = True
+                    break
+                try:
+                    instance_id = json.loads(record)["instance_id"]
+                except (ValueError, KeyError, TypeError):
+                    logger.warning(f"Skipping unreadable line of {self.path} at byte {end}")
+                else:
+                    entries.append((instance_id, end, len(record), zlib.crc32(record)))
+                    changed = True
+                end += len(record)
+
+        if changed:
+            # 인덱스를 통째로 다시 쓴 뒤 교체
+            temp_path = self.index_path + ".tmp"
+            with open(temp_path, "w") as f:
+                for entry in entries:
+                    f.write("\t".join(map(str, entry)) + "\n")
+            os.replace(temp_path, self.index_path)
+        self.entries = entries
+        self.instance_ids = {entry[0] for entry in entries}
+
+    def append(self, instance_id, line):
+        """
+        Appends one JSON line for instance_id, then its index entry.
+        """
+        record = (line + "\n").encode("utf-8")
+        offset = self.handle.tell()
+        self.handle.write(record)
+        self.handle.flush()
+        entry = (instance_id, offset, len(record), zlib.crc32(record))
+        self.index_handle.write("\t".join(map(str, entry)) + "\n")
+        self.index_handle.flush()
+        self.entries.append(entry)
+        self.instance_ids.add(instance_id)
+
+    def iter_lines(self, instance_ids=None):
+        """
+        Yields (instance_id, JSON line) in file order, seeking straight to the
+        records of instance_ids (all records by default).
+        """
+        self.handle.flush()
+        with open(self.path, "rb") as f:
+            for instance_id, offset, length, _ in self.entries:
+                if instance_ids is not None and instance_id not in instance_ids:
+                    continue
+                f.seek(offset)
+                yield instance_id, f.read(length).decode("utf-8")
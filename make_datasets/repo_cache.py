@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+저장소별 bare mirror 캐시. 머신당 한 번만 GitHub에서 클론하고, 이후 작업 디렉토리는
+mirror의 객체 저장소를 alternates로 공유하는 로컬 클론으로 만들어 네트워크 없이 바로 생성합니다.
+"""
+
+import fcntl
+import os
+import shutil
+import subprocess
+from contextlib import contextmanager
+from pathlib import Path
+
+# 스크립트와 파이프라인이 모두 같은 캐시를 쓰도록 환경 변수로 위치를 지정
+DEFAULT_CACHE_DIR = os.environ.get(
+    "SWE_RA_REPO_CACHE", os.path.join(Path.home(), ".cache", "swe_ra", "repos")
+)
+
+
+def get_repo_url(repo, token=None):
+    """
+    Remote URL of a "owner/name" repository.
+    """
+    # MONAI 저장소는 직접 GitHub에서 클론 (토큰 없이)
+    if repo == "Project-MONAI/MONAI":
+        return "https://github.com/Project-MONAI/MONAI.git"
+    # 다른 저장소는 기존 방식 사용
+    if token is None:
+        token = os.environ.get("GITHUB_TOKEN", "git")
+    return f"https://{token}@github.com/swe-bench-repos/" + repo.replace("/", "__") + ".git"
+
+
+class RepoCache:
+    """
+    One bare mirror per repository under cache_dir. clone() makes working
+    copies that borrow the mirror's objects through alternates (git clone
+    --shared), so after the first clone on a machine, new checkouts are local
+    and updates are a fetch into the mirror. Mirror creation and fetches
+    hold a file lock, so concurrent scripts can share cache_dir. Mirrors are
+    created with auto gc and pruning off, since shared clones may still
+    reference objects that a fetch --prune leaves unreachable.
+    """
+
+    def __init__(self, cache_dir=None, verbose=False, token=None):
+        self.cache_dir = Path(cache_dir or DEFAULT_CACHE_DIR).resolve().as_posix()
+        self.verbose = verbose
+        self.token = token
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def _git(self, args, cwd=None, check=True):
+        output = {} if self.verbose else {"stdout": subprocess.DEVNULL, "stderr": subprocess.DEVNULL}
+        return subprocess.run(["git", *args], cwd=cwd, check=check, **output)
+
+    def mirror_path(self, repo):
+        return os.path.join(self.cache_dir, repo.replace("/", "__") + ".git")
+
+    @contextmanager
+    def locked(self, repo):
+        with open(self.mirror_path(repo) + ".lock", "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def get_mirror(self, repo, fetch=False):
+        """
+        Path of the bare mirror of repo, cloning it on first use and fetching
+        new refs when fetch is set.
+        """
+        mirror = self.mirror_path(repo)
+        with self.locked(repo):
+            if not os.path.exists(mirror):
+                if self.verbose:
+                    print(f"Mirroring {repo} to {mirror}")
+                # 중간에 실패해도 깨진 mirror가 남지 않도록 임시 경로에 받은 뒤 이동
+                partial = mirror + ".partial"
+                if os.path.exists(partial):
+                    shutil.rmtree(partial)
+                self._git(["clone", "--mirror", get_repo_url(repo, self.token), partial])
+                # --shared 클론들이 mirror의 객체를 참조하므로 mirror에서 객체가 지워지지 않도록 함
+                self._git(["config", "gc.auto", "0"], cwd=partial)
+                self._git(["config", "gc.pruneExpire", "never"], cwd=partial)
+                os.rename(partial, mirror)
+            elif fetch:
+                self._git(["fetch", "--prune", "origin"], cwd=mirror)
+        return mirror
+
+    def has_commit(self, repo, commit):
+        result = self._git(
+            ["cat-file", "-e", f"{commit}^{{commit}}"], cwd=self.mirror_path(repo), check=False
+        )
+        return result.returncode == 0
+
+    def ensure_commit(self, repo, commit):
+        """
+        Fetches into the mirror if commit is not in it yet.
+        """
+        mirror = self.get_mirror(repo)
+        if not self.has_commit(repo, commit):
+            self.get_mirror(repo, fetch=True)
+        return mirror
+
+    def clone(self, repo, dest, fetch=False):
+        """
+        Working copy of repo at dest (default branch checked out) that reads
+        objects from the mirror, so commits fetched into the mirror later are
+        visible in it too. With fetch, the mirror is updated first so the
+        clone sees the latest refs. An existing dest is left as it is.
+        """
+        if not os.path.exists(dest):
+            mirror = self.get_mirror(repo, fetch=fetch)
+            if self.verbose:
+                print(f"Cloning {repo} to {dest} from {mirror}")
+            self._git(["clone", "--shared", mirror, dest])
+        return dest
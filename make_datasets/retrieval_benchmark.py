@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+BM25 검색 품질과 비용을 측정합니다. filtered_prs.json의 각 PR에 대해 code_snapshots로 인덱스를 만들고,
+patches/의 gold 패치가 수정한 파일(create_instance.get_oracle_filenames와 같은 기준)을 정답으로
+recall@k, MRR, nDCG@k와 fit / query 시간, 최대 메모리를 JSON으로 기록합니다.
+"""
+
+import json
+import math
+import os
+import resource
+import time
+import tracemalloc
+from argparse import ArgumentParser
+from copy import deepcopy
+
+import unidiff
+
+from bm25 import (
+    DOCUMENT_SOURCES,
+    PENALTY_KEYWORDS,
+    PathReranker,
+    aggregate_chunk_hits,
+    get_retriever_class,
+    get_tokenizer,
+    group_by_base_commit,
+    make_query,
+    split_chunk_docid,
+)
+from bm25_benchmark import percentile
+
+
+def get_oracle_filenames(patch):
+    """
+    Returns the filenames that are changed in the patch
+    """
+    # create_instance.get_oracle_filenames와 같은 기준 (swebench 없이 실행할 수 있도록 복사)
+    return {
+        patch_file.source_file.split("a/", 1)[-1]
+        for patch_file in unidiff.PatchSet(patch)
+    }
+
+
+def ranking_metrics(docids, gold_files, ks):
+    """
+    Binary-relevance metrics of a ranked list of docids against gold_files.
+    Recall counts every gold file, including ones missing from the snapshot
+    (e.g. files added by the patch), so it matches what a prompt can contain.
+    """
+    relevant = [docid in gold_files for docid in docids]
+    metrics = {}
+    for k in ks:
+        metrics[f"recall@{k}"] = sum(relevant[:k]) / len(gold_files)
+        dcg = sum(1 / math.log2(rank + 2) for rank, hit in enumerate(relevant[:k]) if hit)
+        idcg = sum(1 / math.log2(rank + 2) for rank in range(min(k, len(gold_files))))
+        metrics[f"ndcg@{k}"] = dcg / idcg
+    first_hit = next((rank for rank, hit in enumerate(relevant) if hit), None)
+    metrics["mrr"] = 1 / (first_hit + 1) if first_hit is not None else 0.0
+    return metrics
+
+
+def mean_metrics(records, ranking):
+    if not records:
+        return {}
+    names = records[0]['metrics'][ranking].keys()
+    return {
+        name: sum(record['metrics'][ranking][name] for record in records) / len(records)
+        for name in names
+    }
+
+
+def peak_rss_mb():
+    # ru_maxrss는 Linux에서 KB 단위이며 프로세스 시작 이후의 최댓값
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def main(
+    filtered_prs_file,
+    snapshot_dir,
+    patch_dir,
+    backend,
+    k1,
+    b,
+    tokenizer,
+    strip_comments,
+    strip_strings,
+    prune,
+    chunking,
+    chunk_pool,
+    top_k,
+    rerank_top_k,
+    path_boost,
+    test_penalty,
+    penalty_keywords,
+    path_overlap_weight,
+    ks,
+    trace_memory,
+    output_file,
+):
+    if prune:
+        assert backend == "python", "--prune only works with the python backend"
+    ks = sorted({int(k) for k in ks.split(",")})
+    with open(filtered_prs_file, 'r') as f:
+        filtered_prs = json.load(f)
+    retriever_class = get_retriever_class(backend)
+    search_kwargs = {'prune': True} if prune else {}
+    reranker = PathReranker(
+        path_boost=path_boost,
+        test_penalty=test_penalty,
+        penalty_keywords=[keyword for keyword in penalty_keywords.split(",") if keyword],
+        overlap_weight=path_overlap_weight,
+        top_k=rerank_top_k,
+    )
+
+    records = []
+    skipped = 0
+    for group in group_by_base_commit(filtered_prs):
+        retriever = None
+        fit_seconds = None
+        fit_peak_mb = None
+        for pr in group:
+            pr_number = pr['number']
+            code_snapshot_file = os.path.join(snapshot_dir, f'pr_{pr_number}_code.json')
+            patch_file = os.path.join(patch_dir, f'pr_{pr_number}.patch')
+            query = make_query(pr)
+            if not query or not os.path.exists(code_snapshot_file) or not os.path.exists(patch_file):
+                skipped += 1
+                continue
+            with open(patch_file, 'r', encoding='utf-8') as f:
+                gold_files = get_oracle_filenames(f.read())
+            if not gold_files:
+                skipped += 1
+                continue
+
+            if retriever is None:
+                # PR들이 같은 스냅샷을 공유하면 fit 비용은 그룹의 첫 PR에만 기록
+                if trace_memory:
+                    tracemalloc.start()
+                start_time = time.perf_counter()
+                retriever = retriever_class(
+                    k1=k1,
+                    b=b,
+                    tokenizer=get_tokenizer(tokenizer, strip_comments, strip_strings),
+                )
+                retriever.fit(DOCUMENT_SOURCES[chunking](code_snapshot_file))
+                fit_seconds = time.perf_counter() - start_time
+                if trace_memory:
+                    fit_peak_mb = tracemalloc.get_traced_memory()[1] / (1 << 20)
+                    tracemalloc.stop()
+                corpus_files = {
+                    doc['docid'] if chunking == "file" else split_chunk_docid(doc['docid'])[0]
+                    for doc in retriever.documents
+                }
+            if retriever.N == 0:
+                skipped += 1
+                continue
+
+            start_time = time.perf_counter()
+            if chunking == "file":
+                hits = retriever.search(query, top_k=top_k, **search_kwargs)
+            else:
+                hits = aggregate_chunk_hits(
+                    retriever.search(query, top_k=chunk_pool, **search_kwargs), top_k=top_k
+                )
+            query_seconds = time.perf_counter() - start_time
+            # bm25.py가 실제로 출력하는 순위 (경로 가중치 적용 후 상위 rerank_top_k개)
+            start_time = time.perf_counter()
+            reranked = reranker.rerank(deepcopy(hits), query)
+            rerank_seconds = time.perf_counter() - start_time
+
+            rankings = {
+                'bm25': [hit['docid'] for hit in hits],
+                'reranked': [hit['docid'] for hit in reranked],
+            }
+            records.append({
+                'instance_id': f"MONAI_{pr_number}",
+                'num_docs': retriever.N,
+                'gold_files': sorted(gold_files),
+                'gold_in_corpus': len(gold_files & corpus_files),
+                'fit_seconds': fit_seconds,
+                'fit_peak_mb': fit_peak_mb,
+                'query_ms': query_seconds * 1000,
+                'rerank_ms': rerank_seconds * 1000,
+                'peak_rss_mb': peak_rss_mb(),
+                'hits': rankings,
+                'metrics': {
+                    name: ranking_metrics(docids, gold_files, ks)
+                    for name, docids in rankings.items()
+                },
+            })
+            print(
+                f"{records[-1]['instance_id']}: recall@{ks[-1]} "
+                f"{records[-1]['metrics']['bm25'][f'recall@{ks[-1]}']:.2f}, "
+                f"query {records[-1]['query_ms']:.1f} ms"
+            )
+            fit_seconds = fit_peak_mb = None
+
+    fit_times = [record['fit_seconds'] for record in records if record['fit_seconds'] is not None]
+    query_times = [record['query_ms'] for record in records]
+    rerank_times = [record['rerank_ms'] for record in records]
+    report = {
+        'config': {
+            'backend': backend,
+            'k1': k1,
+            'b': b,
+            'tokenizer': tokenizer,
+            'strip_comments': strip_comments,
+            'strip_strings': strip_strings,
+            'prune': prune,
+            'chunking': chunking,
+            'chunk_pool': chunk_pool,
+            'top_k': top_k,
+            'rerank_top_k': rerank_top_k,
+            'path_boost': path_boost,
+            'test_penalty': test_penalty,
+            'penalty_keywords': penalty_keywords,
+            'path_overlap_weight': path_overlap_weight,
+            'ks': ks,
+        },
+        'summary': {
+            'prs': len(records),
+            'skipped': skipped,
+            'metrics': {name: mean_metrics(records, name) for name in ['bm25', 'reranked']},
+            'fit_seconds_total': sum(fit_times),
+            'fit_seconds_mean': sum(fit_times) / len(fit_times) if fit_times else 0.0,
+            'query_ms_mean': sum(query_times) / len(query_times) if query_times else 0.0,
+            'query_ms_p50': percentile(query_times, 0.5),
+            'query_ms_p95': percentile(query_times, 0.95),
+            'rerank_ms_mean': sum(rerank_times) / len(rerank_times) if rerank_times else 0.0,
+            'peak_rss_mb': peak_rss_mb(),
+        },
+        'per_pr': records,
+    }
+
+    summary = report['summary']
+    print(f"{summary['prs']} PRs evaluated, {summary['skipped']} skipped")
+    for name, metrics in summary['metrics'].items():
+        print(f"{name}: " + ", ".join(f"{metric} {value:.3f}" for metric, value in metrics.items()))
+    print(
+        f"fit {summary['fit_seconds_mean']:.2f}s / snapshot, "
+        f"query {summary['query_ms_mean']:.1f} ms (p95 {summary['query_ms_p95']:.1f} ms), "
+        f"peak RSS {summary['peak_rss_mb']:.0f} MB"
+    )
+    with open(output_file, 'w') as f:
+        json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument("--filtered_prs_file", type=str, default="filtered_prs.json")
+    parser.add_argument("--snapshot_dir", type=str, default="code_snapshots")
+    parser.add_argument("--patch_dir", type=str, default="patches")
+    parser.add_argument("--backend", type=str, default="python", choices=["python", "sparse"])
+    parser.add_argument("--k1", type=float, default=1.5)
+    parser.add_argument("--b", type=float, default=0.75)
+    parser.add_argument("--tokenizer", type=str, default="default", choices=["default", "code"])
+    parser.add_argument("--strip_comments", action="store_true")
+    parser.add_argument("--strip_strings", action="store_true")
+    parser.add_argument("--prune", action="store_true", help="Use MaxScore pruning (python backend).")
+    parser.add_argument("--chunking", type=str, default="file", choices=["file", "ast"])
+    parser.add_argument("--chunk_pool", type=int, default=100, help="Chunks retrieved before aggregating to files.")
+    parser.add_argument("--top_k", type=int, default=20, help="Number of files retrieved (and re-ranked) per PR.")
+    parser.add_argument("--rerank_top_k", type=int, default=5)
+    parser.add_argument("--path_boost", type=float, default=2.0)
+    parser.add_argument("--test_penalty", type=float, default=0.5)
+    parser.add_argument("--penalty_keywords", type=str, default=",".join(PENALTY_KEYWORDS))
+    parser.add_argument("--path_overlap_weight", type=float, default=0.0)
+    parser.add_argument("--ks", type=str, default="1,5,10,20", help="Comma-separated cutoffs for recall / nDCG.")
+    parser.add_argument(
+        "--trace_memory",
+        action="store_true",
+        help="Also record the tracemalloc peak of each fit (slows fitting down).",
+    )
+    parser.add_argument("--output_file", type=str, default="retrieval_benchmark.json")
+    main(**vars(parser.parse_args()))
@@ -2,12 +2,25 @@ import os
 import re
 import ast
 import chardet
+import codecs
+import fcntl
+import hashlib
+import shutil
 import subprocess
+import threading
+from collections import OrderedDict, deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import contextmanager
 from argparse import ArgumentTypeError
-from git import Repo
 from pathlib import Path
 from tempfile import TemporaryDirectory
 
+try:
+    from .repo_cache import RepoCache
+except ImportError:
+    # make_datasets/ 안에서 스크립트로 실행할 때
+    from repo_cache import RepoCache
+
 
 DIFF_PATTERN = re.compile(r"^diff(?:.*)")
 PATCH_PATTERN = re.compile(
@@ -148,126 +161,437 @@ def is_test(name, test_phrases=None):
 class ContextManager:
     def __init__(self, repo_path, base_commit, verbose=False):
         self.repo_path = Path(repo_path).resolve().as_posix()
-        self.old_dir = os.getcwd()
         self.base_commit = base_commit
         self.verbose = verbose
+        self.module_index = None
 
     def __enter__(self):
-        os.chdir(self.repo_path)
+        self.module_index = None  # checkout이 바뀌므로 다시 만듦
+        # 프로세스 cwd는 바꾸지 않음 (경로는 모두 repo_path 기준)
         cmd = f"git reset --hard {self.base_commit} && git clean -fdxq"
         if self.verbose:
-            subprocess.run(cmd, shell=True, check=True)
+            subprocess.run(cmd, shell=True, check=True, cwd=self.repo_path)
         else:
             subprocess.run(
                 cmd,
                 shell=True,
                 check=True,
+                cwd=self.repo_path,
                 stdout=subprocess.DEVNULL,
                 stderr=subprocess.DEVNULL,
             )
         return self
 
+    def get_module_index(self):
+        """
+        Module index of the current checkout, built on first use.
+        """
+        if self.module_index is None:
+            self.module_index = ModuleIndex(self.repo_path)
+        return self.module_index
+
+    def get_tree_reader(self):
+        """
+        Reader of this repository's object store, shared within the process.
+        """
+        return get_tree_reader(self.repo_path)
+
     def get_environment(self):
         raise NotImplementedError()  # TODO: activate conda environment and return the environment file
 
     def get_readme_files(self):
+        """
+        Names of the README files at the top of the repository, relative to repo_path.
+        """
         files = os.listdir(self.repo_path)
-        files = list(filter(lambda x: os.path.isfile(x), files))
+        files = list(filter(lambda x: os.path.isfile(os.path.join(self.repo_path, x)), files))
         files = list(filter(lambda x: x.lower().startswith("readme"), files))
         return files
 
     def __exit__(self, exc_type, exc_val, exc_tb):
-        os.chdir(self.old_dir)
+        pass
+
+
+class WorktreePool:
+    """
+    Pool of git worktrees sharing the object store of one clone per
+    repository. acquire() leases a worktree checked out at a commit without
+    touching the clone or the process cwd, so instances at different base
+    commits can be prepared in parallel. Released worktrees are recycled:
+    checking out the next commit rewrites only the paths that differ.
+    Adding and removing worktrees holds a file lock in the clone, so pools
+    in several processes can share one clone.
+    """
+
+    def __init__(self, root_dir, size=4, verbose=False):
+        self.root_dir = Path(root_dir).resolve().as_posix()
+        self.size = size
+        self.verbose = verbose
+        self.condition = threading.Condition()
+        self.free = {}  # clone -> [(worktree, commit it is at), ...]
+        self.worktrees = {}  # clone -> [worktree, ...]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def _git(self, args, cwd, check=True):
+        output = {} if self.verbose else {"stdout": subprocess.DEVNULL, "stderr": subprocess.DEVNULL}
+        subprocess.run(["git", *args], cwd=cwd, check=check, **output)
+
+    @contextmanager
+    def admin_lock(self, repo_path):
+        # git worktree add/prune/remove는 다른 프로세스가 만드는 중인 worktree 정보를 읽다가 실패할 수 있음
+        with open(os.path.join(repo_path, ".git", "worktree_pool.lock"), "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def acquire(self, repo_path, commit):
+        """
+        Leases a worktree of the clone at repo_path checked out at commit,
+        waiting while all size worktrees of that clone are in use.
+        """
+        repo_path = Path(repo_path).resolve().as_posix()
+        with self.condition:
+            free = self.free.setdefault(repo_path, [])
+            worktrees = self.worktrees.setdefault(repo_path, [])
+            while not free and len(worktrees) >= self.size:
+                self.condition.wait()
+            if free:
+                # 이미 같은 커밋에 있는 worktree가 있으면 우선 사용
+                index = next((i for i, (_, at) in enumerate(free) if at == commit), -1)
+                worktree, _ = free.pop(index)
+            else:
+                # 여러 프로세스가 같은 root_dir을 써도 겹치지 않도록 pid를 이름에 넣음
+                worktree = os.path.join(
+                    self.root_dir,
+                    os.path.basename(repo_path),
+                    f"{os.getpid()}-{len(worktrees)}",
+                )
+                worktrees.append(worktree)
+        try:
+            if os.path.exists(os.path.join(worktree, ".git")):
+                # 바뀐 경로만 다시 쓰고, 추적되지 않는 파일은 지움
+                self._git(["checkout", "-q", "--force", "--detach", commit], worktree)
+                self._git(["clean", "-fdxq"], worktree)
+            else:
+                with self.admin_lock(repo_path):
+                    if os.path.exists(worktree):
+                        # 이전 실행에서 남은 디렉토리
+                        shutil.rmtree(worktree)
+                        self._git(["worktree", "prune"], repo_path)
+                    self._git(["worktree", "add", "--force", "--detach", worktree, commit], repo_path)
+        except BaseException:
+            self.release(repo_path, worktree, None)
+            raise
+        return worktree
+
+    def release(self, repo_path, worktree, commit):
+        repo_path = Path(repo_path).resolve().as_posix()
+        with self.condition:
+            self.free[repo_path].append((worktree, commit))
+            self.condition.notify()
+
+    @contextmanager
+    def lease(self, repo_path, commit):
+        worktree = self.acquire(repo_path, commit)
+        try:
+            yield worktree
+        finally:
+            self.release(repo_path, worktree, commit)
+
+    def close(self):
+        """
+        Removes every worktree the pool created.
+        """
+        with self.condition:
+            for repo_path, worktrees in self.worktrees.items():
+                with self.admin_lock(repo_path):
+                    for worktree in worktrees:
+                        if os.path.exists(worktree):
+                            self._git(["worktree", "remove", "--force", worktree], repo_path, check=False)
+                    self._git(["worktree", "prune"], repo_path, check=False)
+            self.worktrees.clear()
+            self.free.clear()
+
+
+# 같은 저장소를 여러 스레드가 동시에 클론하지 않도록 함
+_CLONE_LOCK = threading.Lock()
+
+
+def has_commit(repo_path, commit):
+    result = subprocess.run(
+        ["git", "cat-file", "-e", f"{commit}^{{commit}}"],
+        cwd=repo_path,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    return result.returncode == 0
 
 
 class AutoContextManager(ContextManager):
-    """Automatically clones the repo if it doesn't exist"""
+    """
+    Automatically clones the repo if it doesn't exist, from the local mirror
+    kept by repo_cache (so only the first clone on a machine hits the network).
+    With a worktree_pool, the instance is prepared in a leased worktree
+    instead of resetting the clone.
+    """
 
-    def __init__(self, instance, root_dir=None, verbose=False, token=None):
-        if token is None:
-            token = os.environ.get("GITHUB_TOKEN", "git")
+    def __init__(
+        self,
+        instance,
+        root_dir=None,
+        verbose=False,
+        token=None,
+        worktree_pool=None,
+        repo_cache=None,
+    ):
+        if repo_cache is None:
+            repo_cache = RepoCache(verbose=verbose, token=token)
         self.tempdir = None
         if root_dir is None:
             self.tempdir = TemporaryDirectory()
             root_dir = self.tempdir.name
         self.root_dir = root_dir
+        self.worktree_pool = worktree_pool
         repo_dir = os.path.join(self.root_dir, instance["repo"].replace("/", "__"))
-        if not os.path.exists(repo_dir):
-            # MONAI 저장소는 직접 GitHub에서 클론 (토큰 없이)
-            if instance["repo"] == "Project-MONAI/MONAI":
-                repo_url = "https://github.com/Project-MONAI/MONAI.git"
-            else:
-                # 다른 저장소는 기존 방식 사용
-                repo_url = (
-                    f"https://{token}@github.com/swe-bench-repos/"
-                    + instance["repo"].replace("/", "__")
-                    + ".git"
-                )
-            if verbose:
-                print(f"Cloning {instance['repo']} to {root_dir}")
-            Repo.clone_from(repo_url, repo_dir)
+        with _CLONE_LOCK:
+            # 이미 있는 클론에 커밋이 있으면 mirror(네트워크)를 거치지 않음
+            if not os.path.exists(repo_dir) or not has_commit(repo_dir, instance["base_commit"]):
+                # 클론은 mirror의 객체를 공유하므로 mirror에 커밋이 있으면 충분
+                repo_cache.ensure_commit(instance["repo"], instance["base_commit"])
+                repo_cache.clone(instance["repo"], repo_dir)
         super().__init__(repo_dir, instance["base_commit"], verbose=verbose)
+        self.clone_path = self.repo_path
         self.instance = instance
 
+    def __enter__(self):
+        if self.worktree_pool is None:
+            return super().__enter__()
+        self.module_index = None
+        self.repo_path = self.worktree_pool.acquire(self.clone_path, self.base_commit)
+        return self
+
     def __exit__(self, exc_type, exc_val, exc_tb):
+        if self.repo_path != self.clone_path:
+            self.worktree_pool.release(self.clone_path, self.repo_path, self.base_commit)
+            self.repo_path = self.clone_path
         if self.tempdir is not None:
             self.tempdir.cleanup()
         return super().__exit__(exc_type, exc_val, exc_tb)
 
 
-def get_imported_modules(filename):
-    with open(filename) as file:
-        tree = ast.parse(file.read(), filename)
-    return [
-        node
-        for node in ast.iter_child_nodes(tree)
-        if isinstance(node, (ast.Import, ast.ImportFrom))
-    ]
+def get_code_chunks(content, filename="<unknown>"):
+    """
+    Splits Python source into retrieval chunks with 1-based, inclusive line
+    spans: runs of module-level statements (imports, docstring, constants),
+    top-level functions, and classes as a header (up to the first method)
+    plus one chunk per method, running up to the next method. Decorators
+    belong to their definition.
+    Unparsable files come back as a single module chunk.
+
+    Returns a list of dicts with 'kind', 'name', 'start' and 'end'.
+    """
+    num_lines = len(content.split("\n"))
+    try:
+        tree = ast.parse(content, filename)
+    except (SyntaxError, ValueError):
+        return [{"kind": "module", "name": "", "start": 1, "end": num_lines}]
+
+    definitions = (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)
+
+    def span(node):
+        start = min([node.lineno] + [d.lineno for d in getattr(node, "decorator_list", [])])
+        return start, node.end_lineno
+
+    chunks = []
+    module_start = None
+    module_end = None
+    for node in tree.body:
+        if not isinstance(node, definitions):
+            if module_start is None:
+                module_start = 1 if not chunks else span(node)[0]
+            module_end = span(node)[1]
+            continue
+        if module_start is not None:
+            chunks.append({"kind": "module", "name": "", "start": module_start, "end": module_end})
+            module_start = None
+        start, end = span(node)
+        if isinstance(node, ast.ClassDef):
+            methods = [child for child in node.body if isinstance(child, definitions)]
+            header_end = span(methods[0])[0] - 1 if methods else end
+            chunks.append({"kind": "class", "name": node.name, "start": start, "end": header_end})
+            for i, method in enumerate(methods):
+                method_start = span(method)[0]
+                # 메서드 사이의 클래스 속성도 색인되도록 다음 메서드 직전(마지막은 클래스 끝)까지 포함
+                method_end = span(methods[i + 1])[0] - 1 if i + 1 < len(methods) else end
+                chunks.append({
+                    "kind": "method",
+                    "name": f"{node.name}.{method.name}",
+                    "start": method_start,
+                    "end": method_end,
+                })
+        else:
+            chunks.append({"kind": "function", "name": node.name, "start": start, "end": end})
+    if module_start is not None:
+        chunks.append({"kind": "module", "name": "", "start": module_start, "end": module_end})
+    if not chunks:
+        chunks.append({"kind": "module", "name": "", "start": 1, "end": num_lines})
+    return chunks
+
+
+class ModuleIndex:
+    """
+    Directory listing of a checkout, taken with a single os.walk, that
+    resolves module names to files: the first directory in walk order whose
+    path ends with the module path, and every .py file in it. Each module
+    name is resolved once.
+    """
+
+    def __init__(self, root_dir):
+        self.root_dir = root_dir
+        self.directories = [
+            (dirpath, [os.path.join(dirpath, filename) for filename in filenames if filename.endswith(".py")])
+            for dirpath, dirnames, filenames in os.walk(root_dir)
+        ]
+        self.resolved = {}  # module path suffix -> files
+
+    def resolve(self, module, level=0):
+        if module is None:
+            return []  # from . import x
+        components = module.split(".")
+        if level > 0:
+            components = components[:-level]
+        suffix = os.sep.join(components)
+        files = self.resolved.get(suffix)
+        if files is None:
+            files = next(
+                (files for dirpath, files in self.directories if dirpath.endswith(suffix)), []
+            )
+            self.resolved[suffix] = files
+        return list(files)
+
 
+def git_blob_sha(data):
+    """
+    SHA-1 that git assigns to a blob with these bytes.
+    """
+    return hashlib.sha1(b"blob %d\0" % len(data) + data).hexdigest()
 
-def resolve_module_to_file(module, level, root_dir):
-    components = module.split(".")
-    if level > 0:
-        components = components[:-level]
-    for dirpath, dirnames, filenames in os.walk(root_dir):
-        if dirpath.endswith(os.sep.join(components)):
-            return [
-                os.path.join(dirpath, filename)
-                for filename in filenames
-                if filename.endswith(".py")
-            ]
-    return []
 
+# blob sha -> ((module, level), ...) of a file's top-level imports
+_IMPORTS_CACHE = OrderedDict()
+_IMPORTS_CACHE_SIZE = 1 << 16
 
-def ingest_file_directory_contents(target_file, root_dir):
+
+def get_imports(filename):
+    """
+    (module, level) pairs of the top-level imports of a file, parsed once
+    per file content (git blob sha) and process.
+    """
+    with open(filename, "rb") as file:
+        data = file.read()
+    sha = git_blob_sha(data)
+    imports = _IMPORTS_CACHE.get(sha)
+    if imports is not None:
+        _IMPORTS_CACHE.move_to_end(sha)
+        return imports
+    tree = ast.parse(data, filename)
+    imports = []
+    for node in ast.iter_child_nodes(tree):
+        if isinstance(node, ast.Import):
+            imports.extend((alias.name, 0) for alias in node.names)
+        elif isinstance(node, ast.ImportFrom):
+            imports.append((node.module, node.level))
+    imports = _IMPORTS_CACHE[sha] = tuple(imports)
+    if len(_IMPORTS_CACHE) > _IMPORTS_CACHE_SIZE:
+        _IMPORTS_CACHE.popitem(last=False)
+    return imports
+
+
+def ingest_file_directory_contents(target_file, root_dir, module_index=None):
+    """
+    Returns target_file and the files of every package it transitively
+    imports, in visiting order. Pass the checkout's module index (e.g.
+    ContextManager.get_module_index()) to share it across calls.
+    """
+    if module_index is None:
+        module_index = ModuleIndex(root_dir)
     imported_files = []
     files_to_check = [target_file]
+    queued = {target_file}
     while files_to_check:
         current_file = files_to_check.pop()
         imported_files.append(current_file)
-        imports = get_imported_modules(current_file)
-        for node in imports:
-            if isinstance(node, ast.Import):
-                for alias in node.names:
-                    files = resolve_module_to_file(alias.name, 0, root_dir)
-                    for file in files:
-                        if file not in imported_files and file not in files_to_check:
-                            files_to_check.append(file)
-            elif isinstance(node, ast.ImportFrom):
-                files = resolve_module_to_file(node.module, node.level, root_dir)
-                for file in files:
-                    if file not in imported_files and file not in files_to_check:
-                        files_to_check.append(file)
+        for module, level in get_imports(current_file):
+            for file in module_index.resolve(module, level):
+                if file not in queued:
+                    queued.add(file)
+                    files_to_check.append(file)
     return imported_files
 
 
-def detect_encoding(filename):
+# chardet은 이 크기까지만 보고 판단 (큰 파일 전체를 검사하면 매우 느림)
+ENCODING_SAMPLE_SIZE = 64 * 1024
+# blob sha -> encoding detected for a file that is not UTF-8 (None for binary)
+_ENCODING_CACHE = OrderedDict()
+_ENCODING_CACHE_SIZE = 1 << 16
+_ENCODING_CACHE_LOCK = threading.Lock()
+
+
+def _decode_or_none(data, encoding):
+    if encoding is None:
+        return None
+    try:
+        return data.decode(encoding)
+    except (UnicodeDecodeError, LookupError):
+        return None
+
+
+def decode_source(data):
     """
-    Detect the encoding of a file
+    Decodes file bytes the way open(filename, encoding=detected).read()
+    did, universal newlines included. Strict UTF-8 is tried first; only
+    files that fail it (or contain NUL bytes) go through chardet, on a
+    bounded sample and on the whole file if the sampled guess cannot
+    decode it, and the detected encoding is cached per blob sha.
+    Returns "[BINARY DATA FILE]" when the bytes cannot be decoded.
     """
-    with open(filename, "rb") as file:
-        rawdata = file.read()
-    return chardet.detect(rawdata)["encoding"]
+    encoding = None
+    if b"\0" not in data:
+        encoding = "utf-8-sig" if data.startswith(codecs.BOM_UTF8) else "utf-8"
+        try:
+            content = data.decode(encoding)
+        except UnicodeDecodeError:
+            encoding = None
+    if encoding is None:
+        sha = git_blob_sha(data)
+        with _ENCODING_CACHE_LOCK:
+            cached = sha in _ENCODING_CACHE
+            if cached:
+                _ENCODING_CACHE.move_to_end(sha)
+                encoding = _ENCODING_CACHE[sha]
+        if not cached:
+            encoding = chardet.detect(data[:ENCODING_SAMPLE_SIZE])["encoding"]
+        content = _decode_or_none(data, encoding)
+        if content is None and not cached and len(data) > ENCODING_SAMPLE_SIZE:
+            # 샘플 뒤에 처음 비 ASCII 바이트가 있으면 샘플 추측이 틀리므로 전체로 다시 감지
+            encoding = chardet.detect(data)["encoding"]
+            content = _decode_or_none(data, encoding)
+        if not cached:
+            with _ENCODING_CACHE_LOCK:
+                _ENCODING_CACHE[sha] = encoding
+                if len(_ENCODING_CACHE) > _ENCODING_CACHE_SIZE:
+                    _ENCODING_CACHE.popitem(last=False)
+        if content is None:
+            return "[BINARY DATA FILE]"
+    # 텍스트 모드 open()과 같은 줄바꿈 변환
+    return content.replace("\r\n", "\n").replace("\r", "\n")
 
 
 def list_files(root_dir, include_tests=False):
@@ -279,23 +603,233 @@ def list_files(root_dir, include_tests=False):
     return files
 
 
-def ingest_directory_contents(root_dir, include_tests=False):
+def read_source_file(root_dir, relative_path):
+    # 파일을 한 번만 읽고 UTF-8로 먼저 디코딩
+    with open(os.path.join(root_dir, relative_path), "rb") as file:
+        return relative_path, decode_source(file.read())
+
+
+def iter_directory_contents(root_dir, include_tests=False, num_workers=8, ordered=False):
+    """
+    Yields (relative_path, content) for the files ingest_directory_contents
+    reads, using a pool of num_workers threads with at most num_workers * 4
+    reads in flight. Files come out as they finish reading, or in list_files
+    order when ordered is set.
+    """
+    relative_paths = iter(list_files(root_dir, include_tests=include_tests))
+    max_pending = num_workers * 4
+    with ThreadPoolExecutor(max_workers=num_workers) as executor:
+        def submit(limit):
+            for relative_path in relative_paths:
+                pending.append(executor.submit(read_source_file, root_dir, relative_path))
+                if len(pending) >= limit:
+                    break
+
+        if ordered:
+            pending = deque()
+            submit(max_pending)
+            while pending:
+                yield pending.popleft().result()
+                submit(max_pending)
+        else:
+            pending = []
+            submit(max_pending)
+            while pending:
+                done, not_done = wait(pending, return_when=FIRST_COMPLETED)
+                pending = list(not_done)
+                for future in done:
+                    yield future.result()
+                submit(max_pending)
+
+
+def ingest_directory_contents(root_dir, include_tests=False, num_workers=1):
+    if num_workers > 1:
+        # 결과 순서는 직렬로 읽을 때와 같음
+        return dict(
+            iter_directory_contents(root_dir, include_tests, num_workers, ordered=True)
+        )
     files_content = {}
     for relative_path in list_files(root_dir, include_tests=include_tests):
-        filename = os.path.join(root_dir, relative_path)
-        encoding = detect_encoding(filename)
-        if encoding is None:
-            content = "[BINARY DATA FILE]"
-        else:
-            try:
-                with open(filename, encoding=encoding) as file:
-                    content = file.read()
-            except (UnicodeDecodeError, LookupError):
-                content = "[BINARY DATA FILE]"
-        files_content[relative_path] = content
+        _, files_content[relative_path] = read_source_file(root_dir, relative_path)
     return files_content
 
 
+class GitTreeReader:
+    """
+    Reads the files of any commit straight from a repository's object store,
+    without checking it out. Trees are listed with git ls-tree -r and blobs
+    are streamed through one long-lived git cat-file --batch process, so the
+    working tree is never touched and several commits (or threads) can read
+    from the same repository at once.
+
+    list_files / iter_directory_contents / ingest_directory_contents mirror
+    the module functions of the same name, with a commit instead of a root_dir.
+    """
+
+    def __init__(self, repo_path):
+        self.repo_path = Path(repo_path).resolve().as_posix()
+        self.lock = threading.Lock()
+        self.process = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self):
+        if self.process is not None:
+            self.process.stdin.close()
+            self.process.wait()
+            self.process.stdout.close()
+            self.process = None
+
+    def list_tree(self, commit, paths=None):
+        """
+        (path, blob sha) of every regular file in the tree of commit, or
+        only of the given repository-relative paths.
+        """
+        output = subprocess.run(
+            # 경로를 패턴이 아닌 그대로의 이름으로 취급
+            ["git", "--literal-pathspecs", "ls-tree", "-r", "-z", "--full-tree", commit, "--"]
+            + list(paths or []),
+            cwd=self.repo_path,
+            check=True,
+            stdout=subprocess.PIPE,
+        ).stdout
+        files = []
+        for entry in output.split(b"\0"):
+            if not entry:
+                continue
+            info, path = entry.split(b"\t", 1)
+            mode, kind, sha = info.split()
+            # 서브모듈(commit)과 심볼릭 링크(120000)는 제외
+            if kind == b"blob" and mode != b"120000":
+                files.append((os.fsdecode(path), sha.decode()))
+        return files
+
+    def read_object(self, name):
+        """
+        Raw bytes of a blob, given as a sha or "<commit>:<path>". Returns
+        None when no such blob exists.
+        """
+        with self.lock:
+            if self.process is None:
+                self.process = subprocess.Popen(
+                    ["git", "cat-file", "--batch"],
+                    cwd=self.repo_path,
+                    stdin=subprocess.PIPE,
+                    stdout=subprocess.PIPE,
+                )
+            self.process.stdin.write(name.encode("utf-8") + b"\n")
+            self.process.stdin.flush()
+            header = self.process.stdout.readline()
+            if not header:
+                raise RuntimeError(f"git cat-file exited unexpectedly in {self.repo_path}")
+            # "<sha> <type> <size>" 또는 "<name> missing"
+            fields = header.rsplit(b" ", 2)
+            if len(fields) != 3 or not fields[2].strip().isdigit():
+                return None
+            data = self.process.stdout.read(int(fields[2]))
+            self.process.stdout.read(1)  # 내용 뒤의 줄바꿈
+        return data if fields[1] == b"blob" else None
+
+    def read_file(self, commit, path):
+        """
+        Decoded contents of path at commit, or None if it does not exist.
+        """
+        data = self.read_object(f"{commit}:{path}")
+        return None if data is None else decode_source(data)
+
+    def _source_files(self, commit, include_tests):
+        return [
+            (path, sha)
+            for path, sha in self.list_tree(commit)
+            if path.endswith(".py") and (include_tests or not is_test(path))
+        ]
+
+    def list_files(self, commit, include_tests=False):
+        return [path for path, _ in self._source_files(commit, include_tests)]
+
+    def iter_directory_contents(self, commit, include_tests=False):
+        for path, sha in self._source_files(commit, include_tests):
+            yield path, decode_source(self.read_object(sha))
+
+    def ingest_directory_contents(self, commit, include_tests=False):
+        return dict(self.iter_directory_contents(commit, include_tests))
+
+
+class BlobCache:
+    """
+    Process-wide LRU of decoded file contents keyed by git blob SHA, bounded
+    by total characters, so a file shared by many instances of a repository
+    is read and decoded once. Safe to use from several threads.
+    """
+
+    def __init__(self, max_chars=1 << 27):
+        self.max_chars = max_chars
+        self.entries = OrderedDict()  # sha -> text
+        self.chars = 0
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, sha, reader):
+        """
+        Decoded contents of blob sha, read through reader on a miss.
+        """
+        with self.lock:
+            text = self.entries.get(sha)
+            if text is not None:
+                self.entries.move_to_end(sha)
+                self.hits += 1
+                return text
+            self.misses += 1
+        text = decode_source(reader.read_object(sha))
+        with self.lock:
+            if sha not in self.entries:
+                self.entries[sha] = text
+                self.chars += len(text)
+                while self.chars > self.max_chars and len(self.entries) > 1:
+                    self.chars -= len(self.entries.popitem(last=False)[1])
+        return text
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "blobs": len(self.entries),
+            "chars": self.chars,
+        }
+
+
+BLOB_CACHE = BlobCache()
+
+# 저장소 경로 -> GitTreeReader (프로세스마다 cat-file 하나씩)
+_TREE_READERS = {}
+_TREE_READERS_LOCK = threading.Lock()
+
+
+def get_tree_reader(repo_path):
+    """
+    Process-wide GitTreeReader for the repository (or worktree) at repo_path.
+    """
+    repo_path = Path(repo_path).resolve().as_posix()
+    with _TREE_READERS_LOCK:
+        if repo_path not in _TREE_READERS:
+            _TREE_READERS[repo_path] = GitTreeReader(repo_path)
+        return _TREE_READERS[repo_path]
+
+
+def close_tree_readers():
+    with _TREE_READERS_LOCK:
+        for reader in _TREE_READERS.values():
+            reader.close()
+        _TREE_READERS.clear()
+
+
 def string_to_bool(v):
     if isinstance(v, bool):
         return v